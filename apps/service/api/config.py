@@ -2,13 +2,24 @@
 Configuration module for managing environment variables and app settings.
 """
 import os
+from dataclasses import dataclass
+from functools import cached_property
 from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+_TRUE_VALUES = frozenset({"1", "true", "yes", "on"})
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in _TRUE_VALUES
+
+
+@dataclass(frozen=True)
 class Settings:
     """Application settings loaded from environment variables."""
     
@@ -20,31 +31,60 @@ class Settings:
     
     # Blocksight API Configuration
     BLOCKSIGHT_API_KEY: str = os.getenv("BLOCKSIGHT_API_KEY", "")
+    
+    # Let the Blockscout chat model request several independent tools in one step;
+    # the agent's tool node already runs all calls from a single message concurrently
+    BLOCKSCOUT_PARALLEL_TOOL_CALLS: bool = _env_bool("BLOCKSCOUT_PARALLEL_TOOL_CALLS", False)
 
     # Alchemy API Configuration
     ALCHEMY_API_KEY: str = os.getenv("ALCHEMY_API_KEY", "")
     
+    # ENS resolution cache (entries / seconds)
+    WALLET_RESOLVE_CACHE_SIZE: int = int(os.getenv("WALLET_RESOLVE_CACHE_SIZE", "50000"))
+    WALLET_RESOLVE_CACHE_TTL: int = int(os.getenv("WALLET_RESOLVE_CACHE_TTL", "3600"))
+    # Seconds a name that failed to resolve is rejected without another lookup
+    WALLET_RESOLVE_NEGATIVE_TTL: int = int(os.getenv("WALLET_RESOLVE_NEGATIVE_TTL", "60"))
+    
+    # Alchemy requests per second shared by all wallet streams
+    ALCHEMY_MAX_REQUESTS_PER_SEC: float = float(os.getenv("ALCHEMY_MAX_REQUESTS_PER_SEC", "25"))
+    
     # API Configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT: int = int(os.getenv("API_PORT", "8000"))
-    API_RELOAD: bool = os.getenv("API_RELOAD", "True").lower() == "true"
+    API_PORT: int = int(os.environ["API_PORT"]) if "API_PORT" in os.environ else 8000
+    API_RELOAD: bool = _env_bool("API_RELOAD", True)
+    DISABLE_DOCS: bool = _env_bool("DISABLE_DOCS", False)
+    
+    # CORS Configuration (comma-separated origins, "*" allows any origin)
+    CORS_ORIGINS: tuple[str, ...] = tuple(
+        origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()
+    )
     
     # App Metadata
     APP_NAME: str = "NL to SQL Query Service"
     APP_VERSION: str = "1.0.0"
     APP_DESCRIPTION: str = "Natural Language to SQL Query API using Google Gemini"
     
-    def validate(self) -> tuple[bool, Optional[str]]:
-        """Validate that required settings are present."""
+    @property
+    def DOCS_ENABLED(self) -> bool:
+        """Interactive docs are only served in dev (reload) mode unless disabled explicitly."""
+        return self.API_RELOAD and not self.DISABLE_DOCS
+    
+    @cached_property
+    def _validation_error(self) -> Optional[str]:
+        """First missing required setting, computed once per (immutable) instance."""
         if not self.DATABASE_URL:
-            return False, "DATABASE_URL is not set in environment variables"
+            return "DATABASE_URL is not set in environment variables"
         if not self.GOOGLE_API_KEY:
-            return False, "GOOGLE_API_KEY is not set in environment variables"
+            return "GOOGLE_API_KEY is not set in environment variables"
         if not self.ALCHEMY_API_KEY:
-            return False, "ALCHEMY_API_KEY is not set in environment variables"
-        return True, None
+            return "ALCHEMY_API_KEY is not set in environment variables"
+        return None
+    
+    def validate(self) -> tuple[bool, Optional[str]]:
+        """Validate that required settings are present."""
+        error = self._validation_error
+        return error is None, error
 
 
 # Create a global settings instance
 settings = Settings()
-
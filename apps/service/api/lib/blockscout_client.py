@@ -1,7 +1,9 @@
 import asyncio
 import os
+import sys
+from collections import deque
 from dotenv import load_dotenv
-from typing import List
+from typing import Deque
 
 from langchain.agents import create_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -16,6 +18,11 @@ load_dotenv()
 # --- Configuration ---
 BLOCKSCOUT_MCP_URL: str = "https://mcp.blockscout.com/mcp"
 GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+MAX_HISTORY: int = int(os.getenv("MAX_HISTORY", "40"))
+# Tools never offered to the agent; keeping them out also keeps their schemas out of the prompt
+EXCLUDED_TOOLS: frozenset[str] = frozenset({"read_contract"})
+# Answer output is flushed on newlines or after this many streamed chunks
+STDOUT_FLUSH_EVERY: int = 32
 
 
 async def main():
@@ -69,14 +76,15 @@ Based on the data I just retrieved, I support 18 different blockchains, includin
             
             # Load the tools using the LIVE session
             all_tools = await load_mcp_tools(session)
-            tools = [t for t in all_tools if t.name != "read_contract"]
-            for tool in tools:
-                tool._run = lambda *args, **kwargs: asyncio.run(tool._arun(*args, **kwargs))
+            # The agent is driven through astream, so tools are always awaited via
+            # their native async path; no sync _run shim is needed
+            tools = [t for t in all_tools if t.name not in EXCLUDED_TOOLS]
             
             print(f"✅ Puck is connected and has {len(tools)} tools ready.")
 
             agent = create_agent(model=llm, tools=tools, system_prompt=system_prompt)
-            chat_history: List[HumanMessage | AIMessage | ToolMessage] = []
+            # Bounded so long sessions don't grow the prompt (and per-turn copy) forever
+            chat_history: Deque[HumanMessage | AIMessage | ToolMessage] = deque(maxlen=MAX_HISTORY)
 
             print("\n--- Puck: Your Blockchain Analyst ---")
             print("Ask me anything about blockchain data, or type 'exit' to quit.")
@@ -90,11 +98,15 @@ Based on the data I just retrieved, I support 18 different blockchains, includin
 
                     print("\nPuck:")
                     
-                    messages_for_agent = chat_history + [HumanMessage(content=user_input)]
+                    history_len = len(chat_history)
+                    messages_for_agent = list(chat_history)
+                    messages_for_agent.append(HumanMessage(content=user_input))
                     
                     final_answer_chunks = []
                     tool_calls = []
                     final_answer = ""
+                    write = sys.stdout.write
+                    unflushed = 0
                     
                     # Stream the agent's response
                     async for chunk in agent.astream(
@@ -112,12 +124,20 @@ Based on the data I just retrieved, I support 18 different blockchains, includin
                             print(f"🧠 Thinking...")
                         elif isinstance(latest_message, AIMessage) and latest_message.content:
                             final_answer_chunks.append(latest_message.content)
-                            print(latest_message.content, end="", flush=True)
+                            write(latest_message.content)
+                            unflushed += 1
+                            if unflushed >= STDOUT_FLUSH_EVERY or "\n" in latest_message.content:
+                                sys.stdout.flush()
+                                unflushed = 0
 
+                    sys.stdout.flush()
                     final_answer = "".join(final_answer_chunks)
                     
-                    chat_history.clear()
-                    chat_history.extend(chunk["messages"])
+                    # Only append this turn's messages (question, tool traffic, answer)
+                    chat_history.extend(chunk["messages"][history_len:])
+                    # Never start the history mid-turn with an orphaned tool call/result
+                    while chat_history and not isinstance(chat_history[0], HumanMessage):
+                        chat_history.popleft()
 
                 except Exception as e:
                     print(f"\n\nAn error occurred: {e}")
@@ -2,6 +2,7 @@
 Main FastAPI application for Natural Language to SQL Query Service.
 """
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Add parent directory to path to allow imports
@@ -9,6 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from api.config import settings
 from api.routes import query_routes, wallet_routes, chat_routes
@@ -18,22 +20,38 @@ is_valid, error_message = settings.validate()
 if not is_valid:
     raise RuntimeError(f"Configuration error: {error_message}")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release long-lived upstream connections on shutdown."""
+    yield
+    await chat_routes.shutdown()
+    await wallet_routes.shutdown()
+
+
 # Initialize FastAPI app
+# The OpenAPI schema is only built when /openapi.json is first requested, so skipping
+# the docs routes in production also skips that schema walk entirely.
 app = FastAPI(
     title=settings.APP_NAME,
     description=settings.APP_DESCRIPTION,
     version=settings.APP_VERSION,
-    docs_url="/docs",
-    redoc_url="/redoc",
+    docs_url="/docs" if settings.DOCS_ENABLED else None,
+    redoc_url="/redoc" if settings.DOCS_ENABLED else None,
+    openapi_url="/openapi.json" if settings.DOCS_ENABLED else None,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Configure CORS
+# Explicit method/header lists keep preflight checks to plain membership tests;
+# set CORS_ORIGINS to the frontend origin(s) in production
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
+    allow_origins=list(settings.CORS_ORIGINS),
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # Include routers
@@ -49,7 +67,7 @@ async def root():
         "name": settings.APP_NAME,
         "version": settings.APP_VERSION,
         "description": settings.APP_DESCRIPTION,
-        "docs": "/docs",
+        "docs": "/docs" if settings.DOCS_ENABLED else None,
         "health": "/api/v1/health"
     }
 
@@ -2,21 +2,52 @@
 API routes for Blockscout chat endpoints.
 """
 import logging
+import orjson
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
-
-from api.services.blockscout_chat_service import blockscout_chat_service
+from typing import Annotated, Any, Dict, List
+from typing_extensions import TypedDict
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["chat"])
 
+# Health payload is static, so it is encoded once at import
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "blockscout-chat"})
+
+
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a Server-Sent Events data frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+_CHAT_COMPLETE_EVENT = _sse_event({"type": "complete", "message": "Chat response complete"})
+
+
+@lru_cache(maxsize=1)
+def _chat_service():
+    """Import the chat service on first use so LangChain/MCP stay out of app startup."""
+    from api.services.blockscout_chat_service import blockscout_chat_service
+    return blockscout_chat_service
 
-class ChatMessage(BaseModel):
-    """Model for a chat message."""
-    role: str = Field(..., description="Role of the message sender (user or assistant)")
-    content: str = Field(..., description="Content of the message")
+
+async def shutdown():
+    """Close the chat service's MCP session if the service was ever loaded."""
+    if _chat_service.cache_info().currsize:
+        await _chat_service().aclose()
+
+
+class ChatMessage(TypedDict):
+    """
+    Model for a chat message.
+
+    Declared as a TypedDict so validated history arrives as plain dicts and can be
+    forwarded to the chat service without a per-message model_dump().
+    """
+    role: Annotated[str, Field(description="Role of the message sender (user or assistant)")]
+    content: Annotated[str, Field(description="Content of the message")]
 
 
 class ChatRequest(BaseModel):
@@ -52,8 +83,8 @@ class ChatResponse(BaseModel):
         }
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_blockscout(request: ChatRequest) -> ChatResponse:
+@router.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
+async def chat_with_blockscout(request: ChatRequest) -> ORJSONResponse:
     """
     Chat with the blockchain using Blockscout integration.
     
@@ -70,25 +101,66 @@ async def chat_with_blockscout(request: ChatRequest) -> ChatResponse:
     """
     try:
         logger.info(f"Received chat request: {request.message[:50]}...")
-        response = await blockscout_chat_service.process_message(
+        response = await _chat_service().process_message(
             message=request.message,
-            chat_history=[msg.model_dump() for msg in request.chat_history]
+            chat_history=request.chat_history
         )
         logger.info(f"Generated response length: {len(response) if response else 0}")
         logger.debug(f"Response preview: {response[:100] if response and len(response) > 100 else response}")
-        return ChatResponse(success=True, response=response)
+        return ORJSONResponse({"success": True, "response": response, "error": None})
     except Exception as e:
         logger.error(f"Chat processing error: {str(e)}", exc_info=True)
         error_msg = f"Chat processing failed: {str(e)}"
-        return ChatResponse(success=False, error=error_msg)
+        return ORJSONResponse({"success": False, "response": None, "error": error_msg})
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_blockscout(request: ChatRequest):
+    """
+    Chat with the blockchain, streaming the answer as it is generated.
+    Returns Server-Sent Events (SSE) stream of token and tool events.
+    
+    Event types:
+        - token: {"type": "token", "content": "..."} piece of the answer
+        - tool_start / tool_end: {"type": "tool_start", "tool": "..."} tool activity
+        - complete / error: end of the stream
+    
+    Args:
+        request: ChatRequest containing the message and chat history
+    """
+    logger.info(f"Received streaming chat request: {request.message[:50]}...")
+    
+    async def event_generator():
+        try:
+            async for event in _chat_service().stream_message(
+                message=request.message,
+                chat_history=request.chat_history
+            ):
+                yield _sse_event(event)
+            
+            # Send completion message
+            yield _CHAT_COMPLETE_EVENT
+        except Exception as e:
+            logger.error(f"Chat streaming error: {str(e)}", exc_info=True)
+            yield _sse_event({"type": "error", "message": f"Chat processing failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+        }
+    )
 
 
-@router.get("/chat/health")
-async def chat_health_check() -> Dict[str, str]:
+@router.get("/chat/health", response_class=Response)
+async def chat_health_check() -> Response:
     """
     Health check endpoint for the chat service.
     
     Returns:
         Simple status message
     """
-    return {"status": "healthy", "service": "blockscout-chat"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
@@ -1,15 +1,24 @@
 """
 API routes for natural language query endpoints.
 """
+import orjson
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List
 
-from api.services.nl_query_service import nl_query_service
-
 router = APIRouter(prefix="/api/v1", tags=["queries"])
 
 
+@lru_cache(maxsize=1)
+def _query_service():
+    """Import the NL query service on first use so LangChain/SQLAlchemy stay out of app startup."""
+    from api.services.nl_query_service import nl_query_service
+    return nl_query_service
+
+
 class QueryRequest(BaseModel):
     """Request model for natural language queries."""
     question: str = Field(..., description="Natural language question about the database")
@@ -45,6 +54,32 @@ class QueryResponse(BaseModel):
         }
 
 
+# Optional QueryResponse fields, so service results serialize to the documented shape
+_QUERY_RESPONSE_DEFAULTS: Dict[str, Any] = dict.fromkeys(("sql_query", "result", "answer", "error"))
+
+# Health payload is static, so it is encoded once at import
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "nl-to-sql-api"})
+
+
+class QueryResultResponse(ORJSONResponse):
+    """
+    ORJSONResponse for query results, which carry arbitrary database driver values.
+    
+    Types orjson can't encode go through FastAPI's jsonable_encoder; values orjson
+    rejects outright (integers wider than 64 bits) fall back to the stdlib encoder.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        try:
+            return orjson.dumps(
+                content,
+                default=jsonable_encoder,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            )
+        except orjson.JSONEncodeError:
+            return JSONResponse.render(self, jsonable_encoder(content))
+
+
 class DatabaseInfoResponse(BaseModel):
     """Response model for database information."""
     connected: bool
@@ -53,8 +88,8 @@ class DatabaseInfoResponse(BaseModel):
     error: str | None = None
 
 
-@router.post("/query", response_model=QueryResponse)
-async def execute_natural_language_query(request: QueryRequest) -> QueryResponse:
+@router.post("/query", response_model=None, responses={200: {"model": QueryResponse}})
+async def execute_natural_language_query(request: QueryRequest) -> QueryResultResponse:
     """
     Execute a natural language query against the database.
     
@@ -70,8 +105,10 @@ async def execute_natural_language_query(request: QueryRequest) -> QueryResponse
         QueryResponse with SQL query, results, and natural language answer
     """
     try:
-        result = nl_query_service.answer_user_question(request.question)
-        return QueryResponse(**result)
+        result = await _query_service().answer_user_question(request.question)
+        # Skip building and re-dumping a QueryResponse per request; values the service
+        # didn't convert are handled by QueryResultResponse
+        return QueryResultResponse({**_QUERY_RESPONSE_DEFAULTS, **result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
@@ -85,19 +122,19 @@ async def get_database_info() -> DatabaseInfoResponse:
         DatabaseInfoResponse with connection status, dialect, and available tables
     """
     try:
-        info = nl_query_service.get_database_info()
+        info = _query_service().get_database_info()
         return DatabaseInfoResponse(**info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get database info: {str(e)}")
 
 
-@router.get("/health")
-async def health_check() -> Dict[str, str]:
+@router.get("/health", response_class=Response)
+async def health_check() -> Response:
     """
     Health check endpoint to verify the service is running.
     
     Returns:
         Simple status message
     """
-    return {"status": "healthy", "service": "nl-to-sql-api"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
@@ -2,17 +2,179 @@
 API routes for wallet data endpoints.
 Provides streaming and parallel-fetch endpoints for blockchain data.
 """
-import json
 import asyncio
+import re
+import time
+import orjson
+from collections import OrderedDict
+from async_lru import alru_cache
+from contextlib import aclosing
+from functools import lru_cache
+from eth_utils import is_address, to_checksum_address
 from fastapi import APIRouter, Query, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncGenerator
 
-from api.services.wallet_service import wallet_service
+from api.config import settings
 
 router = APIRouter(prefix="/api/v1/wallet", tags=["wallet"])
 
+# Largest page Alchemy returns for asset transfers (mirrors wallet_service)
+MAX_TRANSFERS_PER_PAGE = 1000
+# Batches with at least this many items are serialized in a worker thread
+SSE_THREAD_ENCODE_THRESHOLD = 500
+# Pages fetched ahead of the client before the upstream fetcher pauses
+NFT_PREFETCH_PAGES = 4
+TRANSFER_PREFETCH_PAGES = 1
+# Ready SSE frames are written together until a write reaches this size
+SSE_COALESCE_BYTES = 64 * 1024
+# Checksummed addresses remembered, since each conversion hashes the address with keccak256
+CHECKSUM_CACHE_SIZE = 100_000
+
+# Marks the end of a prefetched stream
+_STREAM_END = object()
+
+# Input shaped like a hex address; these are never treated as ENS names
+_HEX_ADDRESS_RE = re.compile(r"^(0x)?[0-9a-fA-F]{40}$")
+
+_checksum_address = lru_cache(maxsize=CHECKSUM_CACHE_SIZE)(to_checksum_address)
+
+# Names that recently failed to resolve, with the monotonic time of the failure, oldest
+# first; capped at WALLET_RESOLVE_CACHE_SIZE entries
+_unresolved: "OrderedDict[str, float]" = OrderedDict()
+
+
+@lru_cache(maxsize=1)
+def _wallet_service():
+    """Import the wallet service on first use so the Alchemy SDK stays out of app startup."""
+    from api.services.wallet_service import wallet_service
+    return wallet_service
+
+
+async def shutdown():
+    """Close the wallet service's HTTP session if the service was ever loaded."""
+    if _wallet_service.cache_info().currsize:
+        await _wallet_service().aclose()
+
+
+@alru_cache(maxsize=settings.WALLET_RESOLVE_CACHE_SIZE, ttl=settings.WALLET_RESOLVE_CACHE_TTL)
+async def _resolve_name(address: str) -> str:
+    """Resolve an ENS name (or unusual address form), reusing the result until the TTL expires."""
+    return await _wallet_service().resolve_address(address)
+
+
+async def _resolve(address: str) -> str:
+    """
+    Resolve an address or ENS name; plain hex addresses skip the cache and any I/O.
+    
+    Hex addresses with an invalid mixed-case checksum are rejected, never lowercased.
+    Names are cached case-insensitively, and names that have no ENS record are
+    rejected for WALLET_RESOLVE_NEGATIVE_TTL seconds without another lookup.
+    Lookups that fail upstream are not cached and raise a 502.
+    """
+    if _HEX_ADDRESS_RE.match(address):
+        if is_address(address):
+            return _checksum_address(address)
+        raise ValueError(f"Invalid address checksum: {address}")
+    
+    name = address.lower()
+    now = time.monotonic()
+    failed_at = _unresolved.get(name)
+    if failed_at is not None:
+        if now - failed_at < settings.WALLET_RESOLVE_NEGATIVE_TTL:
+            raise ValueError(f"Invalid address or ENS name: {address}")
+        del _unresolved[name]
+    
+    try:
+        return await _resolve_name(name)
+    except ValueError:
+        # Re-insert so the entry moves to the newest end, then evict the oldest
+        _unresolved.pop(name, None)
+        _unresolved[name] = now
+        while len(_unresolved) > settings.WALLET_RESOLVE_CACHE_SIZE:
+            _unresolved.popitem(last=False)
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"ENS resolution failed: {str(e)}") from e
+
+
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a Server-Sent Events data frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+# Completion frames never change, so they are encoded once
+_TRANSFERS_COMPLETE_EVENT = _sse_event({"type": "complete", "message": "Transfer fetch complete"})
+_NFTS_COMPLETE_EVENT = _sse_event({"type": "complete", "message": "NFT fetch complete"})
+
+
+async def _sse_batch_event(batch: Dict[str, Any]) -> bytes:
+    """Encode a data batch as an SSE frame, moving large batches off the event loop."""
+    if len(batch.get("data", ())) >= SSE_THREAD_ENCODE_THRESHOLD:
+        return await asyncio.to_thread(_sse_event, batch)
+    return _sse_event(batch)
+
+
+async def _prefetched(
+    stream: AsyncGenerator[Dict[str, Any], None],
+    maxsize: int
+) -> AsyncGenerator[List[Dict[str, Any]], None]:
+    """
+    Drive a wallet stream from a background task through a bounded queue.
+    
+    Yields lists of every batch that is ready when the consumer asks, so slow
+    clients receive coalesced writes while the fetcher blocks once the queue
+    is full instead of buffering without limit.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    
+    async def produce():
+        try:
+            async with aclosing(stream):
+                async for batch in stream:
+                    await queue.put(batch)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_STREAM_END)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            ready = [await queue.get()]
+            while not queue.empty():
+                ready.append(queue.get_nowait())
+            
+            batches = []
+            for item in ready:
+                if item is _STREAM_END or isinstance(item, Exception):
+                    if batches:
+                        yield batches
+                    if item is _STREAM_END:
+                        return
+                    raise item
+                batches.append(item)
+            yield batches
+    finally:
+        producer.cancel()
+
+
+async def _collect(
+    stream: AsyncGenerator[Dict[str, Any], None],
+    max_batches: int
+) -> List[Dict[str, Any]]:
+    """Flatten the "data" of up to max_batches batches from a wallet stream."""
+    items = []
+    count = 0
+    async with aclosing(stream):
+        async for batch in stream:
+            items.extend(batch.get("data", []))
+            count += 1
+            if count >= max_batches:
+                break
+    return items
+
 
 @router.get("/{address}/transfers/stream")
 async def stream_wallet_transfers(
@@ -20,7 +182,8 @@ async def stream_wallet_transfers(
     from_block: str = Query("0x0", description="Starting block (hex)"),
     max_transfers: int = Query(0, description="Max transfers per direction (0 = unlimited)"),
     include_nft: bool = Query(True, description="Include NFT transfers"),
-    direction: str = Query("both", description="Direction: 'from', 'to', or 'both'")
+    direction: str = Query("both", description="Direction: 'from', 'to', or 'both'"),
+    with_metadata: bool = Query(True, description="Include block timestamps (disable for smaller pages)")
 ):
     """
     Stream wallet transfers as they're fetched.
@@ -34,6 +197,7 @@ async def stream_wallet_transfers(
                       - direction="from"/"to": fetches max_transfers total
         include_nft: Include ERC721/ERC1155 transfers
         direction: Transfer direction - "from", "to", or "both" (default: "both")
+        with_metadata: Include each transfer's block timestamp (default: true)
     
     Examples:
         - direction="both", max_transfers=1000: Returns up to 1000 from + 1000 to = 2000 total
@@ -44,32 +208,32 @@ async def stream_wallet_transfers(
         raise HTTPException(status_code=400, detail="direction must be 'from', 'to', or 'both'")
     
     try:
-        resolved_address = await wallet_service.resolve_address(address)
+        resolved_address = await _resolve(address)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
     async def event_generator():
         try:
-            async for batch in wallet_service.stream_transfers(
-                resolved_address,
-                from_block,
-                max_transfers,
-                include_nft,
-                direction
+            # The next page is fetched while the current one is encoded and sent
+            async for batches in _prefetched(
+                _wallet_service().stream_transfers(
+                    resolved_address,
+                    from_block,
+                    max_transfers,
+                    include_nft,
+                    direction,
+                    with_metadata
+                ),
+                maxsize=TRANSFER_PREFETCH_PAGES
             ):
-                # Yield the data
-                data = f"data: {json.dumps(batch)}\n\n"
-                yield data.encode('utf-8')
-                
-                # Force a small delay to allow the response to flush
-                await asyncio.sleep(0.01)
+                for batch in batches:
+                    # Yield the data
+                    yield await _sse_batch_event(batch)
             
             # Send completion message
-            completion = f"data: {json.dumps({'type': 'complete', 'message': 'Transfer fetch complete'})}\n\n"
-            yield completion.encode('utf-8')
+            yield _TRANSFERS_COMPLETE_EVENT
         except Exception as e:
-            error = f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-            yield error.encode('utf-8')
+            yield _sse_event({"type": "error", "message": str(e)})
     
     return StreamingResponse(
         event_generator(),
@@ -92,9 +256,11 @@ async def get_wallet_token_balances(address: str):
         address: Ethereum address or ENS name
     """
     try:
-        resolved_address = await wallet_service.resolve_address(address)
-        balances = await wallet_service.get_token_balances(resolved_address)
+        resolved_address = await _resolve(address)
+        balances = await _wallet_service().get_token_balances(resolved_address)
         return balances
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -115,26 +281,34 @@ async def stream_wallet_nfts(
         page_size: Number of NFTs per batch (max 100)
     """
     try:
-        resolved_address = await wallet_service.resolve_address(address)
+        resolved_address = await _resolve(address)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
     async def event_generator():
         try:
-            async for batch in wallet_service.stream_nfts(resolved_address, page_size):
-                # Yield the data
-                data = f"data: {json.dumps(batch)}\n\n"
-                yield data.encode('utf-8')
-                
-                # Force a small delay to allow the response to flush
-                await asyncio.sleep(0.01)
+            async for batches in _prefetched(
+                _wallet_service().stream_nfts(resolved_address, page_size),
+                maxsize=NFT_PREFETCH_PAGES
+            ):
+                # Yield the data, one event per page but coalesced into fewer writes
+                frames = []
+                size = 0
+                for batch in batches:
+                    frame = _sse_event(batch)
+                    frames.append(frame)
+                    size += len(frame)
+                    if size >= SSE_COALESCE_BYTES:
+                        yield b"".join(frames)
+                        frames = []
+                        size = 0
+                if frames:
+                    yield b"".join(frames)
             
             # Send completion message
-            completion = f"data: {json.dumps({'type': 'complete', 'message': 'NFT fetch complete'})}\n\n"
-            yield completion.encode('utf-8')
+            yield _NFTS_COMPLETE_EVENT
         except Exception as e:
-            error = f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-            yield error.encode('utf-8')
+            yield _sse_event({"type": "error", "message": str(e)})
     
     return StreamingResponse(
         event_generator(),
@@ -152,7 +326,8 @@ async def get_wallet_full_data(
     address: str,
     include_nft: bool = Query(False, description="Include NFT data (default: false for performance)"),
     max_transfers: int = Query(100, description="Max transfers per direction (default: 100, max: 10000)"),
-    direction: str = Query("both", description="Direction: 'from', 'to', or 'both'")
+    direction: str = Query("both", description="Direction: 'from', 'to', or 'both'"),
+    with_metadata: bool = Query(True, description="Include transfer block timestamps (disable for smaller responses)")
 ):
     """
     Get wallet data in one request (not streaming).
@@ -163,6 +338,7 @@ async def get_wallet_full_data(
         include_nft: Include NFT data (default: false for performance)
         max_transfers: Maximum transfers per direction (default: 100, capped at 10000)
         direction: Transfer direction - "from", "to", or "both"
+        with_metadata: Include each transfer's block timestamp (default: true)
     
     Returns:
         Wallet data including limited transfers, tokens, and optionally NFTs
@@ -174,52 +350,71 @@ async def get_wallet_full_data(
     max_transfers = min(max_transfers, 10000) if max_transfers > 0 else 100
     
     try:
-        resolved_address = await wallet_service.resolve_address(address)
+        resolved_address = await _resolve(address)
         
         # Run all fetches in parallel using asyncio.gather
         async def fetch_transfers():
-            transfers = []
-            count = 0
-            async for batch in wallet_service.stream_transfers(
-                resolved_address,
-                "0x0",
-                max_transfers,
-                False,  # Don't include NFTs in transfers
-                direction
-            ):
-                transfers.extend(batch.get("data", []))
-                count += 1
-                # Limit to prevent too many batches
-                if count >= 10:  # Max 10 batches
-                    break
-            return transfers
+            # Small bounded reads fit in one upstream page per direction
+            if max_transfers <= MAX_TRANSFERS_PER_PAGE:
+                return await _wallet_service().get_transfers_batch(
+                    resolved_address,
+                    "0x0",
+                    max_transfers,
+                    False,  # Don't include NFTs in transfers
+                    direction,
+                    with_metadata
+                )
+            
+            # Drain each direction as its own stream so "from" and "to" pages
+            # are fetched concurrently instead of one after the other
+            directions = ["from", "to"] if direction == "both" else [direction]
+            results = await asyncio.gather(*(
+                _collect(
+                    _wallet_service().stream_transfers(
+                        resolved_address,
+                        "0x0",
+                        max_transfers,
+                        False,  # Don't include NFTs in transfers
+                        d,
+                        with_metadata
+                    ),
+                    max_batches=10  # Limit to prevent too many batches
+                )
+                for d in directions
+            ))
+            return [transfer for result in results for transfer in result]
         
         async def fetch_nfts():
-            if not include_nft:
-                return None
-            nfts = []
-            count = 0
-            async for batch in wallet_service.stream_nfts(resolved_address, page_size=100):
-                nfts.extend(batch.get("data", []))
-                count += 1
-                # Limit to first 200 NFTs (2 batches)
-                if count >= 2:
-                    break
+            # Limit to first 200 NFTs (2 batches)
+            nfts = await _collect(
+                _wallet_service().stream_nfts(resolved_address, page_size=100),
+                max_batches=2
+            )
             return {"ownedNfts": nfts, "totalCount": len(nfts)}
         
-        # Fetch all data in parallel
-        transfers, token_balances, nfts = await asyncio.gather(
-            fetch_transfers(),
-            wallet_service.get_token_balances(resolved_address),
-            fetch_nfts(),
-            return_exceptions=False
+        # Fetch all data in parallel, starting the multi-page transfer fetch first
+        transfers_task = asyncio.create_task(fetch_transfers())
+        token_balances_task = asyncio.create_task(
+            _wallet_service().get_token_balances(resolved_address)
         )
+        nfts_task = asyncio.create_task(fetch_nfts()) if include_nft else None
+        tasks = [t for t in (transfers_task, token_balances_task, nfts_task) if t is not None]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave sibling fetches (and their connections) running after a failure
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
         
         return {
-            "transfers": transfers,
-            "tokenBalances": token_balances,
-            "nfts": nfts
+            "transfers": transfers_task.result(),
+            "tokenBalances": token_balances_task.result(),
+            "nfts": nfts_task.result() if nfts_task else None
         }
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
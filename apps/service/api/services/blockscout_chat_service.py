@@ -4,17 +4,19 @@ Service for handling Blockscout-based chat interactions.
 import asyncio
 import os
 import logging
-from typing import List, Dict, Any
+from typing import AsyncGenerator, List, Dict, Any, Optional
 from dotenv import load_dotenv
 
 from langchain.agents import create_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, ToolMessage
 
 from mcp import ClientSession
 from mcp.client.streamable_http import streamablehttp_client
 from langchain_mcp_adapters.tools import load_mcp_tools
 
+from api.config import settings
+
 load_dotenv()
 
 # Configure logging
@@ -22,6 +24,72 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 BLOCKSCOUT_MCP_URL: str = "https://mcp.blockscout.com/mcp"
+# Seconds between pings that keep the shared MCP session alive
+MCP_KEEPALIVE_SECONDS: float = 30
+
+# Message class for each chat history role; other roles are ignored
+_ROLE_MESSAGES = {"user": HumanMessage, "assistant": AIMessage}
+
+# Tags around the reasoning the system prompt asks for; it is not part of the answer
+_THINKING_OPEN = "<thinking>"
+_THINKING_CLOSE = "</thinking>"
+
+# Added to the system prompt when settings.BLOCKSCOUT_PARALLEL_TOOL_CALLS is enabled
+PARALLEL_TOOL_CALLS_RULE = """*   **Parallel Lookups:** When a question needs several lookups that do not depend on each other's results (e.g. a balance and recent transactions for the same address), request all of those tool calls together in a single step instead of one at a time.
+"""
+
+
+def _text_content(content: str | List[Any]) -> str:
+    """Text of a message's content, flattening list content (e.g. Gemini parts) to its text parts."""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
+class _ThinkingFilter:
+    """
+    Removes <thinking>...</thinking> spans from text that arrives in pieces.
+    
+    A trailing piece that could be the start of a tag is held back until the
+    next piece (or flush) shows whether it is one.
+    """
+    
+    def __init__(self):
+        self._pending = ""
+        self._inside = False
+    
+    def feed(self, text: str) -> str:
+        """Add streamed text and return the part that is safe to show."""
+        self._pending += text
+        visible = []
+        while True:
+            tag = _THINKING_CLOSE if self._inside else _THINKING_OPEN
+            index = self._pending.find(tag)
+            if index == -1:
+                held = next(
+                    (k for k in range(min(len(tag) - 1, len(self._pending)), 0, -1)
+                     if self._pending.endswith(tag[:k])),
+                    0
+                )
+                if not self._inside:
+                    visible.append(self._pending[:len(self._pending) - held])
+                self._pending = self._pending[len(self._pending) - held:]
+                return "".join(visible)
+            if not self._inside:
+                visible.append(self._pending[:index])
+            self._pending = self._pending[index + len(tag):]
+            self._inside = not self._inside
+    
+    def flush(self) -> str:
+        """Return held-back text once the message is complete."""
+        text = "" if self._inside else self._pending
+        self._pending = ""
+        self._inside = False
+        return text
 
 
 class BlockscoutChatService:
@@ -32,6 +100,10 @@ class BlockscoutChatService:
         self.llm = None
         self.agent = None
         self.tools = None
+        self._session_task: Optional[asyncio.Task] = None
+        # Resolved once the current session's agent is built (or the session fails)
+        self._session_ready: Optional[asyncio.Future] = None
+        self._lock = asyncio.Lock()
         self.system_prompt = """You are Puck, an autonomous and expert blockchain analyst. Your primary goal is to answer the user's questions directly and efficiently. You must act on your own initiative to get the answer.
 
 **DO NOT ask for permission to use a tool.** You are expected to use them proactively.
@@ -52,31 +124,158 @@ When you receive a question, you MUST follow this exact process:
 *   **Pagination Rule:** If a tool's output mentions more data is available, summarize the first page and inform the user. DO NOT fetch more pages unless asked.
 *   **Brevity:** Keep your responses concise and to the point. Avoid unnecessary explanations unless the user asks for details.
 """
+        if settings.BLOCKSCOUT_PARALLEL_TOOL_CALLS:
+            self.system_prompt += PARALLEL_TOOL_CALLS_RULE
     
     async def initialize(self):
-        """Initialize the Blockscout connection and tools."""
-        if self.agent is not None:
-            return  # Already initialized
+        """
+        Open the long-lived Blockscout MCP session and build the agent once.
         
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=self.google_api_key,
-            temperature=0.2
-        )
+        Callers that arrive while the session is still connecting wait for that
+        same session rather than starting another one.
         
-        async with streamablehttp_client(url=BLOCKSCOUT_MCP_URL) as (read, write, _):
-            async with ClientSession(read, write) as session:
-                # Load the tools using the LIVE session
-                all_tools = await load_mcp_tools(session)
-                self.tools = [t for t in all_tools if t.name != "read_contract"]
-                for tool in self.tools:
-                    tool._run = lambda *args, **kwargs: asyncio.run(tool._arun(*args, **kwargs))
+        Returns:
+            The agent, which callers should use rather than re-reading self.agent:
+            the session can close (clearing self.agent) right after this returns
+        """
+        async with self._lock:
+            if self.agent is not None:
+                return self.agent  # Already initialized
+            
+            if self._session_task is None or self._session_task.done():
+                if self.llm is None:
+                    self.llm = ChatGoogleGenerativeAI(
+                        model="gemini-2.0-flash-exp",
+                        google_api_key=self.google_api_key,
+                        temperature=0.2
+                    )
                 
-                self.agent = create_agent(
-                    model=self.llm,
-                    tools=self.tools,
-                    system_prompt=self.system_prompt
-                )
+                self._session_ready = asyncio.get_running_loop().create_future()
+                self._session_task = asyncio.create_task(self._run_session(self._session_ready))
+            ready = self._session_ready
+        
+        # Shielded so a cancelled caller doesn't cancel the future other callers share
+        return await asyncio.shield(ready)
+    
+    async def _run_session(self, ready: asyncio.Future):
+        """
+        Own the MCP connection for as long as it stays healthy.
+        
+        The streamable HTTP client and session are entered and exited inside this
+        one task (their cancel scopes require it), while requests from any task
+        use the agent built on top of them. A failed keepalive ping tears the
+        session down and the next request reconnects lazily.
+        """
+        try:
+            async with streamablehttp_client(url=BLOCKSCOUT_MCP_URL) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    
+                    # Load the tools using the LIVE session
+                    all_tools = await load_mcp_tools(session)
+                    self.tools = [t for t in all_tools if t.name != "read_contract"]
+                    
+                    self.agent = create_agent(
+                        model=self.llm,
+                        tools=self.tools,
+                        system_prompt=self.system_prompt
+                    )
+                    ready.set_result(self.agent)
+                    logger.info(f"Blockscout MCP session ready with {len(self.tools)} tools")
+                    
+                    while True:
+                        await asyncio.sleep(MCP_KEEPALIVE_SECONDS)
+                        await session.send_ping()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning(f"Blockscout MCP session closed: {str(e)}")
+        finally:
+            if not ready.done():
+                # Cancelled (or otherwise stopped) before the agent was built
+                ready.set_exception(ConnectionError("Blockscout MCP session closed before it was ready"))
+            self.agent = None
+            self.tools = None
+    
+    async def aclose(self):
+        """Close the MCP session, if one is open."""
+        if self._session_task is not None:
+            self._session_task.cancel()
+            try:
+                await self._session_task
+            except asyncio.CancelledError:
+                pass
+            self._session_task = None
+    
+    @staticmethod
+    def _build_messages(
+        message: str,
+        chat_history: List[Dict[str, str]] = None
+    ) -> List[HumanMessage | AIMessage]:
+        """Convert the request's chat history plus the new message into agent input."""
+        # Build message history
+        messages = [
+            _ROLE_MESSAGES[msg["role"]](content=msg["content"])
+            for msg in chat_history or ()
+            if msg["role"] in _ROLE_MESSAGES
+        ]
+        
+        # Add current user message
+        messages.append(HumanMessage(content=message))
+        return messages
+    
+    async def stream_message(
+        self,
+        message: str,
+        chat_history: List[Dict[str, str]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream the assistant's response as it is generated.
+        
+        Yields events of type "token" (a piece of model text), "tool_start" (the
+        agent requested a tool) and "tool_end" (a tool result came back).
+        
+        Tokens follow the same rule as process_message: <thinking> blocks are left
+        out, and all other model text is part of the answer, including text in a
+        step that goes on to request tools.
+        
+        Args:
+            message: The user's message
+            chat_history: Previous conversation history
+        """
+        agent = await self.initialize()
+        messages = self._build_messages(message, chat_history)
+        
+        logger.info(f"Starting agent token stream for message: {message[:50]}...")
+        # AI message currently streaming, and its <thinking> filter
+        message_id = None
+        thinking = _ThinkingFilter()
+        async for chunk, _metadata in agent.astream(
+            {"messages": messages},
+            stream_mode="messages"
+        ):
+            if isinstance(chunk, AIMessageChunk):
+                if chunk.id != message_id:
+                    held = thinking.flush()
+                    if held:
+                        yield {"type": "token", "content": held}
+                    message_id = chunk.id
+                
+                for tool_call in chunk.tool_call_chunks:
+                    if tool_call.get("name"):
+                        yield {"type": "tool_start", "tool": tool_call["name"]}
+                content = _text_content(chunk.content) if chunk.content else ""
+                if content:
+                    visible = thinking.feed(content)
+                    if visible:
+                        yield {"type": "token", "content": visible}
+            elif isinstance(chunk, ToolMessage):
+                yield {"type": "tool_end", "tool": chunk.name}
+        
+        held = thinking.flush()
+        if held:
+            yield {"type": "token", "content": held}
     
     async def process_message(
         self, 
@@ -86,6 +285,9 @@ When you receive a question, you MUST follow this exact process:
         """
         Process a user message and return a response.
         
+        The response is the model's text with <thinking> blocks removed, the same
+        text stream_message yields as tokens.
+        
         Args:
             message: The user's message
             chat_history: Previous conversation history
@@ -94,65 +296,34 @@ When you receive a question, you MUST follow this exact process:
             The assistant's response
         """
         try:
-            # Initialize LLM if needed
-            if self.llm is None:
-                self.llm = ChatGoogleGenerativeAI(
-                    model="gemini-2.0-flash-exp",
-                    google_api_key=self.google_api_key,
-                    temperature=0.2
-                )
+            # Connect and build the agent on first use; later calls reuse both
+            agent = await self.initialize()
             
-            # Build message history
-            messages = []
-            if chat_history:
-                for msg in chat_history:
-                    if msg["role"] == "user":
-                        messages.append(HumanMessage(content=msg["content"]))
-                    elif msg["role"] == "assistant":
-                        messages.append(AIMessage(content=msg["content"]))
+            messages = self._build_messages(message, chat_history)
             
-            # Add current user message
-            messages.append(HumanMessage(content=message))
-            
-            # Process with agent using a fresh session
             final_answer_chunks = []
-            all_content = []
+            seen_content = set()
             
-            async with streamablehttp_client(url=BLOCKSCOUT_MCP_URL) as (read, write, _):
-                async with ClientSession(read, write) as session:
-                    # Load tools with active session
-                    all_tools = await load_mcp_tools(session)
-                    tools = [t for t in all_tools if t.name != "read_contract"]
-                    for tool in tools:
-                        tool._run = lambda *args, **kwargs: asyncio.run(tool._arun(*args, **kwargs))
-                    
-                    agent = create_agent(
-                        model=self.llm,
-                        tools=tools,
-                        system_prompt=self.system_prompt
-                    )
-                    
-                    # Stream the agent's response and collect the final answer
-                    logger.info(f"Starting agent stream for message: {message[:50]}...")
-                    async for chunk in agent.astream(
-                        {"messages": messages},
-                        stream_mode="values"
-                    ):
-                        latest_message = chunk["messages"][-1]
-                        logger.debug(f"Received message type: {type(latest_message).__name__}")
-                        
-                        # Collect all AIMessage content
-                        if isinstance(latest_message, AIMessage):
-                            logger.debug(f"AIMessage - has content: {bool(latest_message.content)}, has tool_calls: {bool(latest_message.tool_calls)}")
-                            if latest_message.content:
-                                # Collect content whether it has tool calls or not
-                                content = latest_message.content
-                                logger.debug(f"Content preview: {content[:100] if len(content) > 100 else content}")
-                                if content not in all_content:
-                                    all_content.append(content)
-                                    if not latest_message.tool_calls:
-                                        # Only add to final answer if it's not a tool call
-                                        final_answer_chunks.append(content)
+            # Stream the agent's response and collect the final answer
+            logger.info(f"Starting agent stream for message: {message[:50]}...")
+            async for chunk in agent.astream(
+                {"messages": messages},
+                stream_mode="values"
+            ):
+                latest_message = chunk["messages"][-1]
+                logger.debug(f"Received message type: {type(latest_message).__name__}")
+                
+                # Collect all AIMessage content
+                if isinstance(latest_message, AIMessage):
+                    logger.debug(f"AIMessage - has content: {bool(latest_message.content)}, has tool_calls: {bool(latest_message.tool_calls)}")
+                    if latest_message.content:
+                        content = _text_content(latest_message.content)
+                        logger.debug(f"Content preview: {content[:100] if len(content) > 100 else content}")
+                        # The values stream repeats messages; each one counts once
+                        if content not in seen_content:
+                            seen_content.add(content)
+                            thinking = _ThinkingFilter()
+                            final_answer_chunks.append(thinking.feed(content) + thinking.flush())
             
             # Join all collected chunks
             final_answer = "".join(final_answer_chunks).strip()
@@ -161,10 +332,7 @@ When you receive a question, you MUST follow this exact process:
             
             if not final_answer:
                 logger.warning("No final answer collected from agent")
-                logger.debug(f"All content collected: {all_content}")
-                # If we have any content at all, return it
-                if all_content:
-                    return "".join(all_content).strip()
+                logger.debug(f"All content collected: {seen_content}")
                 return "I apologize, but I couldn't generate a response. Please try rephrasing your question."
             
             return final_answer
@@ -2,18 +2,69 @@
 Natural Language to SQL Query Service.
 Handles conversion of natural language questions to SQL queries and execution.
 """
+import asyncio
+import hashlib
+import logging
 import re
-import pandas as pd
-from typing import Dict, Any
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
 from decimal import Decimal
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
+from uuid import UUID
 from langchain_community.utilities import SQLDatabase
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 
 from api.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Max number of generated SQL queries remembered per process
+SQL_CACHE_SIZE = 10_000
+# Max result rows included in the rephrase prompt
+PROMPT_MAX_ROWS = 20
+
+# Connection pool for generated queries (sized for the default to_thread worker pool)
+DB_POOL_SIZE = 20
+DB_MAX_OVERFLOW = 10
+
+# Markdown code fences the LLM sometimes wraps around generated SQL
+_SQL_FENCE_RE = re.compile(r"```sql|```", re.IGNORECASE)
+
+# Converters for driver values that aren't JSON-serializable, keyed by type. Exact
+# types are looked up directly; subclasses match in this order (datetime before date)
+_JSON_CONVERTERS = {
+    Decimal: float,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    timedelta: timedelta.total_seconds,
+    bytes: bytes.hex,
+    memoryview: memoryview.hex,
+    UUID: str,
+}
+
+# Cell types returned as-is
+_JSON_NATIVE_TYPES = frozenset({str, int, bool, type(None)})
+
+# Column names and raw rows of an executed query
+SQLResult = Tuple[List[str], List[tuple]]
+
+
+@lru_cache(maxsize=1)
+def _get_engine() -> Engine:
+    """Shared engine for executing generated SQL, so queries reuse pooled connections."""
+    return create_engine(
+        settings.DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
 
 class NLQueryService:
     """Service for handling natural language to SQL conversions."""
@@ -22,27 +73,42 @@ class NLQueryService:
         """Initialize the service with database and LLM connections."""
         self.db = None
         self.llm = None
+        self._tables: List[str] = []
+        self._table_info = ""
+        self._schema_hash = ""
+        self._sql_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
         self._initialize()
     
     @staticmethod
-    def _convert_to_json_serializable(obj):
+    def _convert_to_json_serializable(obj, _converters=_JSON_CONVERTERS):
         """
         Convert non-JSON-serializable objects to serializable types.
         
+        Array and JSON cells (lists, tuples, dicts) are converted recursively.
+        
         Args:
             obj: Object to convert
             
         Returns:
-            JSON-serializable version of the object
-        """
-        if isinstance(obj, Decimal):
-            return float(obj)
-        elif isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        elif isinstance(obj, bytes):
-            return obj.hex()
-        elif pd.isna(obj):
-            return None
+            JSON-serializable version of the object (NaN becomes None)
+        """
+        obj_type = type(obj)
+        if obj_type in _JSON_NATIVE_TYPES:
+            return obj
+        convert = _converters.get(obj_type)
+        if convert is not None:
+            return convert(obj)
+        if isinstance(obj, float):
+            return None if obj != obj else obj  # NaN
+        
+        convert_value = NLQueryService._convert_to_json_serializable
+        if isinstance(obj, (list, tuple)):
+            return [convert_value(v) for v in obj]
+        if isinstance(obj, dict):
+            return {k: convert_value(v) for k, v in obj.items()}
+        for cls, convert in _converters.items():
+            if isinstance(obj, cls):
+                return convert(obj)
         return obj
     
     def _initialize(self):
@@ -50,33 +116,61 @@ class NLQueryService:
         try:
             # Initialize database connection
             self.db = SQLDatabase.from_uri(settings.DATABASE_URL)
-            print(f"Connected to database: {self.db.dialect}")
-            print(f"Available tables: {self.db.get_usable_table_names()}")
+            logger.info(f"Connected to database: {self.db.dialect}")
+            self.refresh_schema()
+            logger.info(f"Available tables: {self._tables}")
             
             # Initialize Google Gemini LLM
             self.llm = ChatGoogleGenerativeAI(
                 model="gemini-2.0-flash-exp",
                 google_api_key=settings.GOOGLE_API_KEY
             )
-            print("Gemini LLM initialized successfully")
+            logger.info("Gemini LLM initialized successfully")
             
         except Exception as e:
-            print(f"Error initializing NLQueryService: {e}")
+            logger.error(f"Error initializing NLQueryService: {e}")
             raise
     
-    def generate_sql_from_nl(self, question: str) -> str:
+    def refresh_schema(self):
+        """
+        Reload the table names and table descriptions used in SQL prompts.
+        
+        Reflecting table_info queries the database catalog, so it is captured once
+        and reused; call this after the schema changes. Generated SQL cached for
+        the previous schema is no longer matched.
+        """
+        self._tables = self.db.get_usable_table_names()
+        self._table_info = self.db.table_info
+        self._schema_hash = hashlib.sha1(
+            f"{sorted(self._tables)!r}\n{self._table_info}".encode()
+        ).hexdigest()[:16]
+    
+    def _sql_cache_key(self, question: str) -> Tuple[str, str]:
+        """Key of a question's generated SQL: whitespace-normalized question and schema fingerprint."""
+        return " ".join(question.split()), self._schema_hash
+    
+    async def generate_sql_from_nl(self, question: str) -> str:
         """
         Generate SQL query from natural language question using Gemini.
         
+        Results are kept in an in-process LRU keyed by the whitespace-normalized
+        question and the schema fingerprint, so repeated questions skip the LLM.
+        
         Args:
             question: Natural language question
             
         Returns:
             Generated SQL query string
         """
+        cache_key = self._sql_cache_key(question)
+        cached_sql = self._sql_cache.get(cache_key)
+        if cached_sql is not None:
+            self._sql_cache.move_to_end(cache_key)
+            return cached_sql
+        
         prompt = f"""
-        Available Tables: {self.db.get_usable_table_names()}
-        Table Info: {self.db.table_info}
+        Available Tables: {self._tables}
+        Table Info: {self._table_info}
 
         Generate a **valid PostgreSQL SQL query only** (no markdown, no explanations)
         for the following request:
@@ -84,58 +178,97 @@ class NLQueryService:
         """
 
         # Extract content from AIMessage
-        resp = self.llm.invoke(prompt)
+        resp = await self.llm.ainvoke(prompt)
         sql_query = resp.content.strip() if hasattr(resp, "content") else str(resp).strip()
-        sql_query = re.sub(r"```sql|```", "", sql_query, flags=re.IGNORECASE).strip()
+        if "```" in sql_query:
+            sql_query = _SQL_FENCE_RE.sub("", sql_query).strip()
 
-        print(f"\nNatural Language Question: {question}")
-        print(f"Generated SQL Query:\n{sql_query}")
+        logger.debug(f"Natural Language Question: {question}")
+        logger.debug(f"Generated SQL Query:\n{sql_query}")
+        
+        self._sql_cache[cache_key] = sql_query
+        if len(self._sql_cache) > SQL_CACHE_SIZE:
+            self._sql_cache.popitem(last=False)
         return sql_query
 
-    def execute_generated_sql(self, sql_query: str) -> pd.DataFrame:
+    async def execute_generated_sql(self, sql_query: str) -> SQLResult:
         """
         Execute the generated SQL query on the connected database.
         
+        The database driver is blocking, so the query runs in a worker thread
+        and the event loop stays free for other requests.
+        
         Args:
             sql_query: SQL query string to execute
             
         Returns:
-            DataFrame containing query results
+            Tuple of (column names, result rows)
         """
+        return await asyncio.to_thread(self._execute_sql, sql_query)
+    
+    def _execute_sql(self, sql_query: str) -> SQLResult:
+        """Blocking implementation of execute_generated_sql."""
         try:
             # Use SQLAlchemy directly to get results with column names
-            from sqlalchemy import create_engine, text
-            
-            engine = create_engine(settings.DATABASE_URL)
-            with engine.connect() as connection:
+            with _get_engine().connect() as connection:
                 result = connection.execute(text(sql_query))
                 
                 # Check if query returns rows
                 if result.returns_rows:
-                    rows = result.fetchall()
-                    if rows:
-                        # Create DataFrame with proper column names
-                        df = pd.DataFrame(rows, columns=result.keys())
-                    else:
-                        # Empty result with columns
-                        df = pd.DataFrame(columns=result.keys())
-                else:
-                    # For INSERT/UPDATE/DELETE queries
-                    df = pd.DataFrame([{"affected_rows": result.rowcount}])
-            
-            return df
+                    return list(result.keys()), [tuple(row) for row in result.fetchall()]
+                # For INSERT/UPDATE/DELETE queries
+                return ["affected_rows"], [(result.rowcount,)]
         except Exception as e:
-            print(f"Error executing SQL query: {e}")
+            logger.error(f"Error executing SQL query: {e}")
             raise Exception(f"Database query execution failed: {str(e)}")
 
-    def rephrase_answer(self, question: str, query: str, result: pd.DataFrame) -> str:
+    @staticmethod
+    def _format_result_for_prompt(result: SQLResult) -> str:
+        """
+        Render query results compactly for the LLM prompt.
+        
+        Only the first PROMPT_MAX_ROWS rows are included as CSV, followed by the
+        total row count and sum/mean/min/max of every numeric column when the
+        result was truncated.
+        
+        Args:
+            result: Query result as (column names, rows)
+            
+        Returns:
+            Prompt-ready text
+        """
+        columns, rows = result
+        lines = [",".join(columns)]
+        lines.extend(",".join(map(str, row)) for row in rows[:PROMPT_MAX_ROWS])
+        if len(rows) <= PROMPT_MAX_ROWS:
+            return "\n".join(lines)
+        
+        lines.append(f"... ({len(rows)} rows in total)")
+        for i, column in enumerate(columns):
+            values = [row[i] for row in rows]
+            if not all(
+                isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)
+                for v in values
+            ):
+                continue
+            # Decimal and float can't be added together, so mixed columns are summed as floats
+            if any(isinstance(v, Decimal) for v in values) and any(isinstance(v, float) for v in values):
+                values = [float(v) for v in values]
+            total = sum(values)
+            lines.append(
+                f"{column}: sum={total}, mean={total / len(values)}, "
+                f"min={min(values)}, max={max(values)}"
+            )
+        return "\n".join(lines)
+    
+    async def rephrase_answer(self, question: str, query: str, result: SQLResult) -> str:
         """
         Rephrase SQL results into a natural language answer.
         
         Args:
             question: Original natural language question
             query: Generated SQL query
-            result: Query result DataFrame
+            result: Query result as (column names, rows)
             
         Returns:
             Natural language answer
@@ -153,15 +286,15 @@ Answer:"""
         
         rephrase_chain = answer_prompt | self.llm | StrOutputParser()
         
-        answer = rephrase_chain.invoke({
+        answer = await rephrase_chain.ainvoke({
             "question": question,
             "query": query,
-            "result": result.to_string(index=False)
+            "result": self._format_result_for_prompt(result)
         })
         
         return answer
 
-    def answer_user_question(self, question: str) -> Dict[str, Any]:
+    async def answer_user_question(self, question: str) -> Dict[str, Any]:
         """
         Full NL → SQL → Execute → Answer pipeline.
         
@@ -173,23 +306,28 @@ Answer:"""
         """
         try:
             # Step 1: Generate SQL from natural language
-            sql_query = self.generate_sql_from_nl(question)
+            sql_query = await self.generate_sql_from_nl(question)
             
             # Step 2: Execute SQL query
-            sql_result = self.execute_generated_sql(sql_query)
-            print(f"\nSQL Result:\n{sql_result.to_string(index=False)}")
+            try:
+                sql_result = await self.execute_generated_sql(sql_query)
+            except Exception:
+                # Regenerate next time instead of replaying SQL that fails to run
+                self._sql_cache.pop(self._sql_cache_key(question), None)
+                raise
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"SQL Result:\n{self._format_result_for_prompt(sql_result)}")
             
             # Step 3: Rephrase into natural language answer
-            answer = self.rephrase_answer(question, sql_query, sql_result)
-            print(f"\nFinal Answer:\n{answer}")
-            
-            # Convert DataFrame to list of dictionaries for JSON serialization
-            result_data = sql_result.to_dict(orient='records')
+            answer = await self.rephrase_answer(question, sql_query, sql_result)
+            logger.debug(f"Final Answer:\n{answer}")
             
-            # Convert non-JSON-serializable objects (Decimal, datetime, etc.)
+            # Build row dicts for JSON serialization, converting non-JSON-serializable
+            # objects (Decimal, datetime, etc.) in the same pass
+            columns, rows = sql_result
             result_data = [
-                {k: self._convert_to_json_serializable(v) for k, v in row.items()}
-                for row in result_data
+                {k: self._convert_to_json_serializable(v) for k, v in zip(columns, row)}
+                for row in rows
             ]
             
             return {
@@ -201,9 +339,7 @@ Answer:"""
             }
             
         except Exception as e:
-            import traceback
-            print(f"Error processing question: {e}")
-            print(f"Traceback:\n{traceback.format_exc()}")
+            logger.exception(f"Error processing question: {e}")
             return {
                 "success": False,
                 "question": question,
@@ -220,7 +356,7 @@ Answer:"""
         try:
             return {
                 "dialect": self.db.dialect,
-                "tables": self.db.get_usable_table_names(),
+                "tables": self._tables,
                 "connected": True
             }
         except Exception as e:
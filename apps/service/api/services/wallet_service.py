@@ -3,15 +3,93 @@ Wallet data fetching service using Alchemy SDK.
 Handles streaming wallet data, transfers, NFTs, and token balances.
 """
 import asyncio
-import aiohttp
-from typing import AsyncGenerator, Dict, Any, List, Optional
-from decimal import Decimal
-from eth_utils import is_address, to_checksum_address
+import random
+import time
+from functools import lru_cache
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, Dict, Any, List, Optional, Tuple
+from eth_utils import is_address, keccak, to_checksum_address
+from ens.exceptions import ENSException
 from web3 import Web3
 from alchemy import Alchemy, Network
 
 from api.config import settings
 
+# Largest page alchemy_getAssetTransfers returns (maxCount 0x3e8)
+MAX_TRANSFERS_PER_PAGE = 1000
+# Seconds a fetched token balance response is reused for the same address
+TOKEN_BALANCES_TTL = 10.0
+# Batches buffered between the concurrent "from"/"to" fetchers and the consumer
+TRANSFER_QUEUE_SIZE = 8
+# Connection pool and timeout (seconds) for the shared Alchemy HTTP/2 client
+HTTP_POOL_LIMIT = 100
+HTTP_MAX_KEEPALIVE = 32
+HTTP_KEEPALIVE_TIMEOUT = 75
+HTTP_TIMEOUT = 30.0
+# Retries for rate-limited (429) Alchemy responses, with exponential backoff from this base
+ALCHEMY_MAX_RETRIES = 4
+ALCHEMY_BACKOFF_BASE = 0.5
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# ENS registry and the 4-byte selectors of resolver(bytes32) / addr(bytes32)
+ENS_REGISTRY_ADDRESS = "0x00000000000C2E074eC69A0dFb2997BA6C7d2e1e"
+# Resolver most names use; its addr record is requested alongside the registry lookup
+ENS_PUBLIC_RESOLVER_ADDRESS = "0x231b0Ee14048e9dCcD1d247744d114a4EB5E8E63"
+_ENS_RESOLVER_SELECTOR = "0x0178b8bf"
+_ENS_ADDR_SELECTOR = "0x3b3b57de"
+# ENSIP-10 wildcard resolution: resolve(bytes,bytes), probed via ERC-165 supportsInterface(bytes4)
+_ENS_RESOLVE_SELECTOR = "0x9061b923"
+_ERC165_SELECTOR = "0x01ffc9a7"
+
+
+@lru_cache(maxsize=10_000)
+def _namehash(name: str) -> str:
+    """ENS namehash of a (lowercased) name, as hex without the 0x prefix."""
+    node = b"\x00" * 32
+    for label in reversed(name.split(".")):
+        node = keccak(node + keccak(text=label))
+    return node.hex()
+
+
+def _abi_address(result: str) -> Optional[str]:
+    """Address returned by an eth_call, or None for an empty / zero result."""
+    if len(result) < 66 or int(result[-40:], 16) == 0:
+        return None
+    return "0x" + result[-40:]
+
+
+def _dns_encode(name: str) -> bytes:
+    """DNS wire-format encoding of a name, as ENSIP-10 resolve() expects it."""
+    return b"".join(bytes([len(label)]) + label for label in map(str.encode, name.split("."))) + b"\x00"
+
+
+def _abi_encode_bytes(*values: bytes) -> str:
+    """ABI-encode dynamic bytes arguments, as hex without the 0x prefix."""
+    head = b""
+    tail = b""
+    for value in values:
+        head += (32 * len(values) + len(tail)).to_bytes(32, "big")
+        tail += len(value).to_bytes(32, "big") + value + b"\x00" * (-len(value) % 32)
+    return (head + tail).hex()
+
+
+def _abi_decode_bytes(result: str) -> bytes:
+    """Decode an eth_call result holding a single dynamic bytes value."""
+    raw = bytes.fromhex(result[2:])
+    if len(raw) < 64:
+        return b""
+    offset = int.from_bytes(raw[:32], "big")
+    length = int.from_bytes(raw[offset:offset + 32], "big")
+    return raw[offset + 32:offset + 32 + length]
+
+
+# Marks a finished direction in stream_transfers
+_DIRECTION_DONE = object()
+
 
 class WalletService:
     """Service for fetching wallet data from Ethereum blockchain."""
@@ -19,8 +97,77 @@ class WalletService:
     def __init__(self):
         """Initialize Alchemy connection."""
         self.alchemy_url = f"https://eth-mainnet.g.alchemy.com/v2/{settings.ALCHEMY_API_KEY}"
-        self.w3 = Web3(Web3.HTTPProvider(self.alchemy_url))
         self.alchemy = Alchemy(api_key=settings.ALCHEMY_API_KEY, network=Network.ETH_MAINNET)
+        # Fallback for ENS names the direct eth_call path can't resolve
+        self.w3 = Web3(Web3.HTTPProvider(self.alchemy_url))
+        # In-flight token balance fetches and recent results, keyed by address
+        self._token_balance_tasks: Dict[str, asyncio.Task] = {}
+        self._token_balance_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # Shared HTTP client, created on first use so it binds to the running loop
+        self._client: Optional[httpx.AsyncClient] = None
+        # Token bucket shared by every Alchemy request from this process
+        self._limiter = AsyncLimiter(settings.ALCHEMY_MAX_REQUESTS_PER_SEC, time_period=1.0)
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP/2 client, multiplexing concurrent Alchemy calls over pooled connections."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(HTTP_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_LIMIT,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT
+                )
+            )
+        return self._client
+    
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        json: Any = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[httpx.Response, None]:
+        """
+        Send a rate-limited request to Alchemy on the shared client.
+        
+        JSON bodies are encoded with orjson. 429 responses are retried after
+        Retry-After (or exponential backoff with jitter) up to ALCHEMY_MAX_RETRIES
+        times; any other response is yielded with its body still unread.
+        """
+        client = self._get_client()
+        request = client.build_request(
+            method,
+            url,
+            params=params,
+            content=orjson.dumps(json) if json is not None else None,
+            headers=_JSON_HEADERS if json is not None else None
+        )
+        for attempt in range(ALCHEMY_MAX_RETRIES + 1):
+            async with self._limiter:
+                response = await client.send(request, stream=True)
+            if response.status_code != 429 or attempt == ALCHEMY_MAX_RETRIES:
+                break
+            retry_after = response.headers.get("Retry-After", "")
+            await response.aclose()
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = ALCHEMY_BACKOFF_BASE * 2 ** attempt * (1 + random.random())
+            await asyncio.sleep(delay)
+        
+        try:
+            yield response
+        finally:
+            await response.aclose()
+    
+    async def aclose(self):
+        """Close the shared HTTP client, if one is open."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     def _serialize_sdk_response(self, obj: Any) -> Any:
         """
@@ -63,20 +210,138 @@ class WalletService:
             
         Returns:
             Checksummed Ethereum address
+            
+        Raises:
+            ValueError: The input is not an address and no ENS record resolves it.
+                RPC and network failures propagate as-is, since they say nothing
+                about whether the name exists.
         """
         # Check if it's already a valid address
         if is_address(input_str):
             return to_checksum_address(input_str)
         
         # Try to resolve as ENS
+        resolved = await self._resolve_ens(input_str)
+        if resolved:
+            return to_checksum_address(resolved)
+        
+        raise ValueError(f"Invalid address or ENS name: {input_str}")
+    
+    async def _resolve_ens(self, name: str) -> Optional[str]:
+        """
+        Resolve an ENS name, trying direct eth_calls first.
+        
+        Names the direct path can't resolve (offchain CCIP-read records, names
+        whose ENSIP-15 normalization isn't plain lowercasing) go through web3's
+        ENS client instead.
+        
+        Returns:
+            Resolved address, or None if the name has no resolver or address
+        """
+        if "." not in name:
+            return None
+        resolved = await self._resolve_ens_direct(name.lower())
+        if resolved is None:
+            resolved = await self._resolve_ens_web3(name)
+        return resolved
+    
+    async def _resolve_ens_direct(self, name: str) -> Optional[str]:
+        """
+        Resolve a lowercased ENS name with direct eth_calls: the registry's resolver
+        for the name, then that resolver's addr record.
+        
+        The public resolver's addr record is requested concurrently with the
+        registry lookup, so names using it resolve in one round trip; other
+        resolvers need a second call. Names without a resolver of their own fall
+        back to ENSIP-10 wildcard resolution.
+        
+        Returns:
+            Resolved address, or None if the name has no resolver or address
+        """
+        node = _namehash(name)
+        registry_result, public_result = await asyncio.gather(
+            self._eth_call(ENS_REGISTRY_ADDRESS, _ENS_RESOLVER_SELECTOR + node),
+            self._eth_call(ENS_PUBLIC_RESOLVER_ADDRESS, _ENS_ADDR_SELECTOR + node),
+            return_exceptions=True
+        )
+        if isinstance(registry_result, BaseException):
+            raise registry_result
+        resolver = _abi_address(registry_result)
+        if resolver is None:
+            return await self._resolve_ens_wildcard(name, node)
+        if resolver.lower() == ENS_PUBLIC_RESOLVER_ADDRESS.lower() and isinstance(public_result, str):
+            return _abi_address(public_result)
+        return _abi_address(await self._eth_call(resolver, _ENS_ADDR_SELECTOR + node))
+    
+    async def _resolve_ens_wildcard(self, name: str, node: str) -> Optional[str]:
+        """
+        ENSIP-10 wildcard resolution: ask the resolver of the closest parent name
+        for the addr record via resolve(bytes,bytes), if it implements that interface.
+        
+        Returns:
+            Resolved address, or None if no parent resolver answers for the name
+        """
+        labels = name.split(".")
+        parents = [".".join(labels[i:]) for i in range(1, len(labels))]
+        # Look up every parent's resolver at once; the closest one set wins
+        registry_results = await asyncio.gather(*(
+            self._eth_call(ENS_REGISTRY_ADDRESS, _ENS_RESOLVER_SELECTOR + _namehash(parent))
+            for parent in parents
+        ))
+        resolver = next(filter(None, map(_abi_address, registry_results)), None)
+        if resolver is None:
+            return None
+        
         try:
-            resolved = self.w3.ens.address(input_str)
-            if resolved:
-                return to_checksum_address(resolved)
+            supported = await self._eth_call(
+                resolver, _ERC165_SELECTOR + _ENS_RESOLVE_SELECTOR[2:].ljust(64, "0")
+            )
+            if len(supported) < 66 or int(supported, 16) == 0:
+                return None
+            result = await self._eth_call(
+                resolver,
+                _ENS_RESOLVE_SELECTOR + _abi_encode_bytes(
+                    _dns_encode(name), bytes.fromhex(_ENS_ADDR_SELECTOR[2:] + node)
+                )
+            )
         except Exception:
-            pass
+            # Reverts (including CCIP-read OffchainLookup) are left to the web3 fallback
+            return None
+        return _abi_address("0x" + _abi_decode_bytes(result).hex())
+    
+    async def _resolve_ens_web3(self, name: str) -> Optional[str]:
+        """Resolve a name with web3's (blocking) ENS client in a worker thread."""
+        try:
+            return await asyncio.to_thread(self.w3.ens.address, name)
+        except ENSException:
+            return None
+    
+    async def _eth_call(self, to: str, data: str) -> str:
+        """Run a read-only eth_call against the latest block and return the raw hex result."""
+        payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "eth_call",
+            "params": [{"to": to, "data": data}, "latest"]
+        }
         
-        raise ValueError(f"Invalid address or ENS name: {input_str}")
+        async with self._request("POST", self.alchemy_url, json=payload) as response:
+            if response.status_code != 200:
+                raise Exception(f"Alchemy API returned status {response.status_code}")
+            
+            data = orjson.loads(await response.aread())
+            
+            if "error" in data:
+                raise Exception(f"Alchemy API error: {data['error']}")
+            
+            return data.get("result") or "0x"
+    
+    @staticmethod
+    def _page_size(max_transfers: int, fetched: int) -> int:
+        """Page size for the next transfers request, so bounded reads don't over-fetch."""
+        if max_transfers > 0:
+            return min(MAX_TRANSFERS_PER_PAGE, max_transfers - fetched)
+        return MAX_TRANSFERS_PER_PAGE
     
     async def _get_asset_transfers(
         self,
@@ -86,7 +351,8 @@ class WalletService:
         to_address: Optional[str] = None,
         category: List[str] = None,
         page_key: Optional[str] = None,
-        max_count: int = 1000
+        max_count: int = 1000,
+        with_metadata: bool = True
     ) -> Dict[str, Any]:
         """Get asset transfers using Alchemy REST API."""
         # Build params for the API
@@ -94,7 +360,7 @@ class WalletService:
             "fromBlock": from_block,
             "toBlock": to_block,
             "category": category or ["external", "internal", "erc20", "erc721", "erc1155"],
-            "withMetadata": True,
+            "withMetadata": with_metadata,
             "maxCount": hex(max_count),
             "order": "desc"
         }
@@ -116,17 +382,16 @@ class WalletService:
             "params": [params]
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status != 200:
-                    raise Exception(f"Alchemy API returned status {response.status}")
-                
-                data = await response.json()
-                
-                if "error" in data:
-                    raise Exception(f"Alchemy API error: {data['error']}")
-                
-                return data.get("result", {})
+        async with self._request("POST", url, json=payload) as response:
+            if response.status_code != 200:
+                raise Exception(f"Alchemy API returned status {response.status_code}")
+            
+            data = orjson.loads(await response.aread())
+            
+            if "error" in data:
+                raise Exception(f"Alchemy API error: {data['error']}")
+            
+            return data.get("result", {})
     
     async def stream_transfers(
         self,
@@ -134,12 +399,17 @@ class WalletService:
         from_block: str = "0x0",
         max_transfers: int = 0,
         include_nft: bool = True,
-        direction: str = "both"
+        direction: str = "both",
+        with_metadata: bool = True
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Stream asset transfers for an address.
         Yields batches of transfers as they're fetched.
         
+        For direction="both" the "from" and "to" pages are fetched concurrently and
+        batches are yielded as either side produces them; use each batch's
+        "direction" to tell them apart.
+        
         Args:
             address: Ethereum address
             from_block: Starting block (default: genesis)
@@ -148,102 +418,202 @@ class WalletService:
                          - For "from"/"to": fetches max_transfers total
             include_nft: Include NFT transfers (ERC721, ERC1155)
             direction: Transfer direction - "from", "to", or "both"
+            with_metadata: Include block timestamps; disabling it shrinks every page
         """
         categories = ["external", "internal", "erc20"]
         if include_nft:
             categories.extend(["erc721", "erc1155"])
         
-        # Fetch "from" transfers if requested
-        if direction in ["from", "both"]:
-            page_key = None
-            page = 0
-            from_total = 0
-            
-            while True:
-                if max_transfers > 0 and from_total >= max_transfers:
-                    break
-                
+        if direction != "both":
+            async with aclosing(self._stream_direction(
+                address, from_block, max_transfers, categories, direction, with_metadata
+            )) as stream:
+                async for batch in stream:
+                    yield batch
+            return
+        
+        # Both directions feed one bounded queue so neither runs far ahead of the consumer
+        queue: asyncio.Queue = asyncio.Queue(maxsize=TRANSFER_QUEUE_SIZE)
+        
+        async def pump(d: str):
+            try:
+                async with aclosing(self._stream_direction(
+                    address, from_block, max_transfers, categories, d, with_metadata
+                )) as stream:
+                    async for batch in stream:
+                        await queue.put(batch)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(_DIRECTION_DONE)
+        
+        tasks = [asyncio.create_task(pump(d)) for d in ("from", "to")]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is _DIRECTION_DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _stream_direction(
+        self,
+        address: str,
+        from_block: str,
+        max_transfers: int,
+        categories: List[str],
+        direction: str,
+        with_metadata: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Page through transfers in one direction ("from" or "to") for stream_transfers.
+        
+        The request for the next page is started before the current batch is yielded,
+        so the upstream round trip overlaps with the consumer's work.
+        """
+        address_filter = {"from_address": address} if direction == "from" else {"to_address": address}
+        
+        async def fetch(page_key: Optional[str], fetched: int) -> Dict[str, Any]:
+            return await self._get_asset_transfers(
+                from_block=from_block,
+                to_block="latest",
+                category=categories,
+                page_key=page_key,
+                max_count=self._page_size(max_transfers, fetched),
+                with_metadata=with_metadata,
+                **address_filter
+            )
+        
+        page = 0
+        total = 0
+        next_task = asyncio.create_task(fetch(None, total))
+        try:
+            while next_task is not None:
                 page += 1
-                
-                # Use Alchemy API to get transfers
-                response = await self._get_asset_transfers(
-                    from_block=from_block,
-                    to_block="latest",
-                    from_address=address,
-                    category=categories,
-                    page_key=page_key,
-                    max_count=1000
-                )
+                response = await next_task
+                next_task = None
                 
                 transfers = response.get("transfers", [])
                 
                 if max_transfers > 0:
-                    remaining = max_transfers - from_total
+                    remaining = max_transfers - total
                     transfers = transfers[:remaining]
                 
-                if transfers:
-                    from_total += len(transfers)
-                    yield {
-                        "type": "from_transfers",
-                        "page": page,
-                        "count": len(transfers),
-                        "total": from_total,
-                        "direction": "from",
-                        "data": transfers
-                    }
-                
+                total += len(transfers)
                 page_key = response.get("pageKey")
-                if not page_key or not transfers:
-                    break
-                
-                await asyncio.sleep(0.2)  # Rate limiting
-        
-        # Fetch "to" transfers if requested
-        if direction in ["to", "both"]:
-            page_key = None
-            page = 0
-            to_total = 0
-            
-            while True:
-                if max_transfers > 0 and to_total >= max_transfers:
-                    break
-                
-                page += 1
-                
-                response = await self._get_asset_transfers(
-                    from_block=from_block,
-                    to_block="latest",
-                    to_address=address,
-                    category=categories,
-                    page_key=page_key,
-                    max_count=1000
-                )
-                
-                transfers = response.get("transfers", [])
-                
-                if max_transfers > 0:
-                    remaining = max_transfers - to_total
-                    transfers = transfers[:remaining]
+                # Prefetch the next page unless this one ended the stream
+                if page_key and transfers and not (max_transfers > 0 and total >= max_transfers):
+                    next_task = asyncio.create_task(fetch(page_key, total))
                 
                 if transfers:
-                    to_total += len(transfers)
                     yield {
-                        "type": "to_transfers",
+                        "type": f"{direction}_transfers",
                         "page": page,
                         "count": len(transfers),
-                        "total": to_total,
-                        "direction": "to",
+                        "total": total,
+                        "direction": direction,
                         "data": transfers
                     }
-                
-                page_key = response.get("pageKey")
-                if not page_key or not transfers:
-                    break
-                
-                await asyncio.sleep(0.2)  # Rate limiting
+        finally:
+            if next_task is not None:
+                next_task.cancel()
+    
+    async def get_transfers_batch(
+        self,
+        address: str,
+        from_block: str = "0x0",
+        limit: int = MAX_TRANSFERS_PER_PAGE,
+        include_nft: bool = True,
+        direction: str = "both",
+        with_metadata: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch up to `limit` most recent transfers per direction in one request each.
+        For bounded reads that fit in a single Alchemy page this replaces the
+        stream_transfers page loop; directions are requested concurrently.
+        
+        Args:
+            address: Ethereum address
+            from_block: Starting block (default: genesis)
+            limit: Max transfers per direction (at most MAX_TRANSFERS_PER_PAGE)
+            include_nft: Include NFT transfers (ERC721, ERC1155)
+            direction: Transfer direction - "from", "to", or "both"
+            with_metadata: Include block timestamps; disabling it shrinks the response
+        """
+        if not 0 < limit <= MAX_TRANSFERS_PER_PAGE:
+            raise ValueError(f"limit must be between 1 and {MAX_TRANSFERS_PER_PAGE}")
+        
+        categories = ["external", "internal", "erc20"]
+        if include_nft:
+            categories.extend(["erc721", "erc1155"])
+        
+        requests = []
+        if direction in ["from", "both"]:
+            requests.append(self._get_asset_transfers(
+                from_block=from_block,
+                to_block="latest",
+                from_address=address,
+                category=categories,
+                max_count=limit,
+                with_metadata=with_metadata
+            ))
+        if direction in ["to", "both"]:
+            requests.append(self._get_asset_transfers(
+                from_block=from_block,
+                to_block="latest",
+                to_address=address,
+                category=categories,
+                max_count=limit,
+                with_metadata=with_metadata
+            ))
+        
+        responses = await asyncio.gather(*requests)
+        return [
+            transfer
+            for response in responses
+            for transfer in response.get("transfers", [])[:limit]
+        ]
     
     async def get_token_balances(self, address: str) -> Dict[str, Any]:
-        """Get ERC-20 token balances with metadata and prices using Alchemy Assets API."""
+        """
+        Get ERC-20 token balances with metadata and prices using Alchemy Assets API.
+        
+        Concurrent calls for the same address share one upstream request, and the
+        result is reused for TOKEN_BALANCES_TTL seconds.
+        """
+        cached = self._token_balance_cache.get(address)
+        if cached and time.monotonic() - cached[0] < TOKEN_BALANCES_TTL:
+            return cached[1]
+        
+        task = self._token_balance_tasks.get(address)
+        if task is None:
+            task = asyncio.create_task(self._fetch_token_balances(address))
+            self._token_balance_tasks[address] = task
+            task.add_done_callback(
+                lambda t, addr=address: self._on_token_balances_done(addr, t)
+            )
+        # Shielded so one caller disconnecting doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+    
+    def _on_token_balances_done(self, address: str, task: asyncio.Task):
+        """Retire an in-flight token balance fetch and cache it if it succeeded."""
+        self._token_balance_tasks.pop(address, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        # Drop expired entries so the cache only holds recently requested wallets
+        for addr in [a for a, (ts, _) in self._token_balance_cache.items() if now - ts >= TOKEN_BALANCES_TTL]:
+            del self._token_balance_cache[addr]
+        self._token_balance_cache[address] = (now, task.result())
+    
+    async def _fetch_token_balances(self, address: str) -> Dict[str, Any]:
+        """Fetch token balances for an address from the Alchemy Assets API."""
         try:
             # Use Alchemy Assets API for enriched token data
             url = f"https://api.g.alchemy.com/data/v1/{settings.ALCHEMY_API_KEY}/assets/tokens/balances/by-address"
@@ -257,18 +627,17 @@ class WalletService:
                 ]
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status != 200:
-                        text = await response.text()
-                        raise Exception(f"Alchemy API returned status {response.status}: {text}")
-                    
-                    data = await response.json()
-                    
-                    if "error" in data:
-                        raise Exception(f"Alchemy API error: {data['error']}")
-                    
-                    return data
+            async with self._request("POST", url, json=payload) as response:
+                if response.status_code != 200:
+                    text = (await response.aread()).decode(errors="replace")
+                    raise Exception(f"Alchemy API returned status {response.status_code}: {text}")
+                
+                data = orjson.loads(await response.aread())
+                
+                if "error" in data:
+                    raise Exception(f"Alchemy API error: {data['error']}")
+                
+                return data
         except Exception as e:
             raise Exception(f"Failed to fetch token balances: {str(e)}")
     
@@ -289,49 +658,46 @@ class WalletService:
         # Use Alchemy REST API v3 endpoint
         url = f"https://eth-mainnet.g.alchemy.com/nft/v3/{settings.ALCHEMY_API_KEY}/getNFTsForOwner"
         
-        async with aiohttp.ClientSession() as session:
-            while True:
-                page += 1
+        while True:
+            page += 1
+            
+            try:
+                # Build request params
+                params = {
+                    "owner": address,
+                    "pageSize": str(page_size)
+                }
+                if page_key:
+                    params["pageKey"] = page_key
                 
-                try:
-                    # Build request params
-                    params = {
-                        "owner": address,
-                        "pageSize": str(page_size)
+                # Make API request
+                async with self._request("GET", url, params=params) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"Alchemy API returned status {response.status_code}")
+                    
+                    data = orjson.loads(await response.aread())
+                    
+                    if "error" in data:
+                        raise Exception(f"Alchemy API error: {data['error']}")
+                    
+                    nfts = data.get("ownedNfts", [])
+                    total_nft_count = data.get("totalCount", 0)
+                    
+                    # Always yield data, even if empty (for first page)
+                    total_count += len(nfts)
+                    yield {
+                        "page": page,
+                        "count": len(nfts),
+                        "total": total_count,
+                        "totalCount": total_nft_count,
+                        "data": nfts
                     }
-                    if page_key:
-                        params["pageKey"] = page_key
                     
-                    # Make API request
-                    async with session.get(url, params=params) as response:
-                        if response.status != 200:
-                            raise Exception(f"Alchemy API returned status {response.status}")
-                        
-                        data = await response.json()
-                        
-                        if "error" in data:
-                            raise Exception(f"Alchemy API error: {data['error']}")
-                        
-                        nfts = data.get("ownedNfts", [])
-                        total_nft_count = data.get("totalCount", 0)
-                        
-                        # Always yield data, even if empty (for first page)
-                        total_count += len(nfts)
-                        yield {
-                            "page": page,
-                            "count": len(nfts),
-                            "total": total_count,
-                            "totalCount": total_nft_count,
-                            "data": nfts
-                        }
-                        
-                        page_key = data.get("pageKey")
-                        if not page_key or not nfts:
-                            break
-                        
-                        await asyncio.sleep(0.2)  # Rate limiting
-                except Exception as e:
-                    raise Exception(f"Failed to fetch NFTs: {str(e)}")
+                    page_key = data.get("pageKey")
+                    if not page_key or not nfts:
+                        break
+            except Exception as e:
+                raise Exception(f"Failed to fetch NFTs: {str(e)}")
 
 
 # Global service instance
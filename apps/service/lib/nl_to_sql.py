@@ -1,5 +1,10 @@
+import asyncio
+import json
 import os
+from collections import OrderedDict
+from langchain_community.cache import SQLiteCache
 from langchain_community.utilities import SQLDatabase
+from langchain_core.globals import set_llm_cache
 from langchain_openai import ChatOpenAI
 from langchain.chains import create_sql_query_chain
 from dotenv import load_dotenv
@@ -9,11 +14,36 @@ from openai import APIError, Timeout
 # --- Configuration ---
 load_dotenv()
 
+# Generated SQL remembered per process, keyed by whitespace-normalized question
+SQL_CACHE_SIZE = 1024
+# LLM responses persisted across runs; keys include the full prompt, so a schema change misses.
+# Kept next to this script (not the working directory) unless NL2SQL_LLM_CACHE_PATH is set
+LLM_CACHE_PATH = os.getenv(
+    "NL2SQL_LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".nl2sql_cache.db")
+)
+# Constrain the model to a JSON object holding bare SQL, so it never spends tokens on
+# markdown fences or commentary that would have to be stripped afterwards
+SQL_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "sql",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"sql": {"type": "string"}},
+            "required": ["sql"],
+            "additionalProperties": False
+        }
+    }
+}
+
 if 'OPENROUTER_API_KEY' not in os.environ:
     print("ERROR: OPENROUTER_API_KEY not found in environment variables.")
     exit()
 
 # --- 1. Set up the Language Model (LLM) with OpenRouter ---
+set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
 llm = ChatOpenAI(
     model="meta-llama/llama-3.1-8b-instruct",
     temperature=0,
@@ -28,10 +58,29 @@ if not os.path.exists(db_uri.replace("sqlite:///", "")):
     print("Please run 'python preprocess_data.py' first to create and populate it.")
     exit()
 
-db = SQLDatabase.from_uri(db_uri)
+# Describe every table (CREATE statement + sample rows) once up front; passing the
+# descriptions back as custom_table_info stops the chain re-querying them per question
+_schema_db = SQLDatabase.from_uri(db_uri)
+table_info = {
+    table: _schema_db.get_table_info([table])
+    for table in _schema_db.get_usable_table_names()
+}
+db = SQLDatabase.from_uri(db_uri, custom_table_info=table_info)
 print(f"-> Successfully connected to database: {db_uri}")
 
-sql_query_chain = create_sql_query_chain(llm, db)
+sql_query_chain = create_sql_query_chain(llm.bind(response_format=SQL_RESPONSE_FORMAT), db)
+_sql_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _parse_sql(response: str) -> str:
+    """
+    Extracts the SQL from a model response. Providers that ignore SQL_RESPONSE_FORMAT
+    return plain (possibly fenced) SQL, which is used with the fences stripped.
+    """
+    try:
+        return json.loads(response)["sql"].strip()
+    except (ValueError, TypeError, KeyError):
+        return response.strip().replace("```sql", "").replace("```", "").strip()
 
 
 @retry(
@@ -39,15 +88,26 @@ sql_query_chain = create_sql_query_chain(llm, db)
     stop=stop_after_attempt(3),  
     retry=retry_if_exception_type((APIError, Timeout)) 
 )
-def generate_sql_from_question(question: str) -> str:
+async def generate_sql_from_question(question: str) -> str:
     """
     Takes a user's natural language question, generates a SQL query, and returns it.
     Includes a retry mechanism for API calls.
     """
     print(f"\n-> Generating SQL for question: '{question}'")
+    # The schema is fixed for the life of the process, so the question alone is the key
+    cache_key = " ".join(question.split())
+    cached_sql = _sql_cache.get(cache_key)
+    if cached_sql is not None:
+        _sql_cache.move_to_end(cache_key)
+        return cached_sql
+    
     try:
-        sql_query = sql_query_chain.invoke({"question": question})
-        return sql_query.strip().replace("```sql", "").replace("```", "").strip()
+        response = await sql_query_chain.ainvoke({"question": question})
+        sql_query = _parse_sql(response)
+        _sql_cache[cache_key] = sql_query
+        if len(_sql_cache) > SQL_CACHE_SIZE:
+            _sql_cache.popitem(last=False)
+        return sql_query
     except (APIError, Timeout) as e:
         print(f"An API error occurred. Retrying... Error: {e}")
         raise 
@@ -57,24 +117,28 @@ def generate_sql_from_question(question: str) -> str:
 
 
 # --- Manuall Test Case  ---
-if __name__ == "__main__":
+async def main():
     print("--- Natural Language to SQL Query Generator ---")
     
     query1 = "How many NFTs does the wallet own in total?"
-    generated_sql1 = generate_sql_from_question(query1)
+    generated_sql1 = await generate_sql_from_question(query1)
     print("\n[Generated SQL 1]")
     print(generated_sql1)
     
     print("\n" + "="*50)
     
     query2 = "List the top 5 transactions by block number."
-    generated_sql2 = generate_sql_from_question(query2)
+    generated_sql2 = await generate_sql_from_question(query2)
     print("\n[Generated SQL 2]")
     print(generated_sql2)
 
     print("\n" + "="*50)
 
     query3 = "What are the contract addresses for all the token balances?"
-    generated_sql3 = generate_sql_from_question(query3)
+    generated_sql3 = await generate_sql_from_question(query3)
     print("\n[Generated SQL 3]")
-    print(generated_sql3)
\ No newline at end of file
+    print(generated_sql3)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,30 +1,58 @@
-import os
+import ijson
 import json
-from langchain_community.utilities import SQLDatabase
+import mmap
+import os
+import orjson
+import re
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
 
 # --- Configuration ---
 DATA_DIR = "./wallet_dump_d8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
 DB_PATH = "sqlite:///nl_to_sql.db"
+DB_FILE = DB_PATH.replace("sqlite:///", "")
+# Bound parameters per statement (SQLite's default SQLITE_MAX_VARIABLE_NUMBER before 3.32)
+SQLITE_MAX_VARIABLES = 999
+# Transactions are streamed from the dump and inserted in batches of this many rows
+TX_INSERT_BATCH = 1000
+# Dump files at least this large are memory-mapped instead of read into a bytes copy
+MMAP_MIN_BYTES = 4 * 1024 * 1024
+# Integer literals of 19+ digits may not fit the 64 bits orjson parses exactly (it silently
+# turns wider ones, including negatives below int64 min, into floats); files containing
+# one use the stdlib parser. In-range 19-digit values only cost a slower parse
+_WIDE_INT_RE = re.compile(rb"[:,\[]\s*-?\d{19,}\s*[,}\]]")
+# The loader rebuilds the database from scratch, so durability during the load is
+# traded for speed: no fsyncs, in-memory rollback journal, 64 MiB page cache. Foreign
+# keys all point at the one wallet inserted first, so checking them is pure overhead
+LOAD_PRAGMAS = (
+    "PRAGMA foreign_keys=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
 
-def get_schema():
+# CREATE TABLE statements for the Hybrid Model (Approach B).
+# We use TEXT for JSONB-like storage in SQLite.
+SCHEMA_STATEMENTS: tuple[str, ...] = (
     """
-    Returns the new CREATE TABLE statements for the Hybrid Model (Approach B).
-    We use TEXT for JSONB-like storage in SQLite.
-    """
-    return """
-    CREATE TABLE wallets (
+    CREATE TABLE IF NOT EXISTS wallets (
         address TEXT PRIMARY KEY
-    );
-
-    CREATE TABLE token_balances (
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS token_balances (
         wallet_address TEXT NOT NULL,
         contract_address TEXT NOT NULL,
         raw_balance TEXT,
         PRIMARY KEY (wallet_address, contract_address),
         FOREIGN KEY (wallet_address) REFERENCES wallets(address)
-    );
-
-    CREATE TABLE transactions (
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
         hash TEXT PRIMARY KEY,
         block_number INTEGER,
         from_address TEXT,
@@ -32,9 +60,10 @@ def get_schema():
         status INTEGER,
         tx_data TEXT, -- Stores the 'tx' JSON object
         receipt_data TEXT -- Stores the 'receipt' JSON object
-    );
-
-    CREATE TABLE nfts (
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS nfts (
         wallet_address TEXT NOT NULL,
         contract_address TEXT NOT NULL,
         token_id TEXT NOT NULL,
@@ -43,60 +72,198 @@ def get_schema():
         raw_metadata TEXT, -- Stores the entire NFT JSON object
         PRIMARY KEY (wallet_address, contract_address, token_id),
         FOREIGN KEY (wallet_address) REFERENCES wallets(address)
-    );
-    """
+    )
+    """,
+)
 
-def setup_database_schema(database: SQLDatabase):
+def setup_database_schema(conn: sqlite3.Connection):
     """
-    Executes each CREATE TABLE statement individually.
+    Creates all tables with a single executescript call. Errors propagate: the schema
+    is fixed and idempotent, so a failure here means the database itself is unusable.
     """
     print("-> Setting up new database schema (Hybrid Model)...")
-    schema_string = get_schema()
-    statements = [s.strip() for s in schema_string.split(';') if s.strip()]
-    for stmt in statements:
-        try:
-            modified_stmt = stmt.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS")
-            database.run(modified_stmt)
-        except Exception as e:
-            print(f"Error executing statement: {stmt}\n{e}")
+    conn.executescript(";\n".join(SCHEMA_STATEMENTS) + ";")
     print("-> Schema setup complete.")
 
-def load_data_from_json(database: SQLDatabase):
+def read_json(path: str):
+    """
+    Parses a JSON dump file with orjson. Large files are memory-mapped and parsed
+    in place, skipping the full bytes copy a read() would make.
+    Files with integers wider than orjson handles are parsed with the stdlib json
+    module instead, which keeps them exact.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return _loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _loads(view)
+
+def _loads(data):
+    """orjson.loads, falling back to json.loads when data may hold integers over 64 bits."""
+    if _WIDE_INT_RE.search(data):
+        return json.loads(bytes(data))
+    return orjson.loads(data)
+
+def dumps(obj) -> str:
+    """orjson.dumps as text, with the stdlib encoder for integers over 64 bits."""
+    try:
+        return orjson.dumps(obj).decode()
+    except orjson.JSONEncodeError:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def iter_json_items(path: str):
+    """
+    Streams the items of a top-level JSON array with ijson's default (C) backend.
+    That backend rejects integers over 64 bits; if it hits one, the file is
+    re-streamed with ijson's pure-Python backend from the first item not yet yielded.
+    """
+    yielded = 0
+    with open(path, 'rb') as f:
+        try:
+            for item in ijson.items(f, 'item', use_float=True):
+                yielded += 1
+                yield item
+            return
+        except ijson.JSONError as e:
+            if "integer overflow" not in str(e):
+                raise
+    with open(path, 'rb') as f:
+        items = ijson.get_backend("python").items(f, 'item', use_float=True)
+        yield from islice(items, yielded, None)
+
+def insert_rows(cursor, insert_sql: str, rows: list):
+    """
+    Inserts rows using multi-row VALUES statements, packing as many rows into each
+    statement as SQLITE_MAX_VARIABLES allows. insert_sql is everything before VALUES.
+    Callers pass rows sorted by primary key so B-tree inserts append at the right edge,
+    and already deduplicated on it.
+    """
+    if not rows:
+        return
+    width = len(rows[0])
+    per_statement = SQLITE_MAX_VARIABLES // width
+    row_placeholders = "(" + ", ".join("?" * width) + ")"
+
+    full = len(rows) - len(rows) % per_statement
+    if full:
+        cursor.executemany(
+            f"{insert_sql} VALUES {', '.join([row_placeholders] * per_statement)};",
+            (tuple(chain.from_iterable(rows[i:i + per_statement])) for i in range(0, full, per_statement))
+        )
+    leftover = rows[full:]
+    if leftover:
+        cursor.execute(
+            f"{insert_sql} VALUES {', '.join([row_placeholders] * len(leftover))};",
+            tuple(chain.from_iterable(leftover))
+        )
+
+def build_nft_rows(nfts: list, wallet_address: str) -> list:
+    """
+    Flattens ownedNfts entries into nfts table rows, keeping the first entry per
+    (contract, tokenId) and skipping entries without either. This is the loader's
+    hottest pure-Python loop, so it is kept self-contained with locals pre-bound.
+    """
+    rows = []
+    seen = set()
+    append_row = rows.append
+    mark_seen = seen.add
+
+    for nft in nfts:
+        # Entries that aren't JSON objects have no .get and are skipped; the
+        # happy path pays no isinstance checks
+        try:
+            get = nft.get
+        except AttributeError:
+            continue
+
+        try:
+            contract_address = get('contract').get('address')
+        except AttributeError:
+            continue
+        token_id = get('tokenId')
+
+        if not contract_address or not token_id:
+            continue
+        key = (contract_address, token_id)
+        if key in seen:
+            continue
+        mark_seen(key)
+
+        try:
+            collection_name = get('collection').get('name')
+        except AttributeError:
+            collection_name = None
+
+        append_row((
+            wallet_address,
+            contract_address,
+            token_id,
+            get('name'),
+            collection_name,
+            dumps(nft)
+        ))
+    return rows
+
+def load_data_from_json(conn: sqlite3.Connection):
     """
     Loads data from the JSON files into the new hybrid schema.
+    All inserts run in a single explicit transaction, so SQLite commits (and syncs) once.
+    The connection must be in autocommit mode (isolation_level=None), and the tables
+    empty: rows are deduplicated in Python and inserted without OR IGNORE.
     """
     print("-> Loading data from JSON files...")
     
+    cursor = conn.cursor()
+    # PRAGMAs (journal_mode in particular) must run outside the transaction
+    for pragma in LOAD_PRAGMAS:
+        cursor.execute(pragma)
+    # The two whole-file dumps are parsed in worker threads, overlapping their reads
+    # with each other and with the streamed transaction inserts on this thread
+    with ThreadPoolExecutor(2) as executor:
+        tb_future = executor.submit(read_json, os.path.join(DATA_DIR, 'tokenBalances.json'))
+        nft_future = executor.submit(read_json, os.path.join(DATA_DIR, 'nfts.json'))
+        cursor.execute("BEGIN")
+        try:
+            _load_data(cursor, tb_future, nft_future)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+
+def _load_data(cursor, tb_future: Future, nft_future: Future):
+    """Insert the JSON dump contents through one cursor/transaction."""
     wallet_address = None
 
     # 1. Load Token Balances and establish the primary wallet
     try:
-        with open(os.path.join(DATA_DIR, 'tokenBalances.json'), 'r') as f:
-            data = json.load(f)
+        data = tb_future.result()
         
         wallet_address = data.get('address')
         if not wallet_address:
             raise ValueError("Wallet address not found in tokenBalances.json")
 
-        database.run(
-            "INSERT OR IGNORE INTO wallets (address) VALUES (:address);",
-            parameters={"address": wallet_address}
-        )
+        cursor.execute("INSERT INTO wallets (address) VALUES (?);", (wallet_address,))
         print(f"-> Ensured wallet exists: {wallet_address}")
 
+        # Keep the first balance per contract (what INSERT OR IGNORE used to keep);
+        # balances without a contract would violate NOT NULL and are skipped
+        balances_by_contract = {}
         for balance in data.get('tokenBalances', []):
-            database.run(
-                """
-                INSERT OR IGNORE INTO token_balances (wallet_address, contract_address, raw_balance)
-                VALUES (:wallet, :contract, :balance);
-                """,
-                parameters={
-                    "wallet": wallet_address,
-                    "contract": balance.get('contractAddress'),
-                    "balance": balance.get('tokenBalance')
-                }
-            )
-        print(f"-> Loaded {len(data.get('tokenBalances', []))} token balances.")
+            contract = balance.get('contractAddress')
+            if contract is not None and contract not in balances_by_contract:
+                balances_by_contract[contract] = balance.get('tokenBalance')
+        tb_rows = [
+            (wallet_address, contract, raw_balance)
+            for contract, raw_balance in balances_by_contract.items()
+        ]
+        tb_rows.sort(key=itemgetter(1))
+        insert_rows(
+            cursor,
+            "INSERT INTO token_balances (wallet_address, contract_address, raw_balance)",
+            tb_rows
+        )
+        print(f"-> Loaded {len(tb_rows)} token balances.")
 
     except Exception as e:
         print(f"FATAL: Could not process tokenBalances.json. Error: {e}")
@@ -104,85 +271,70 @@ def load_data_from_json(database: SQLDatabase):
 
     # 2. Load Transactions
     try:
-        with open(os.path.join(DATA_DIR, 'txs_receipts_traces.json'), 'r') as f:
-            tx_data = json.load(f)
-        
-        for record in tx_data:
+        tx_insert = "INSERT INTO transactions (hash, block_number, from_address, to_address, status, tx_data, receipt_data)"
+        tx_rows = []
+        tx_count = 0
+        seen_hashes = set()
+        # Stream records one at a time so memory stays flat regardless of dump size
+        for record in iter_json_items(os.path.join(DATA_DIR, 'txs_receipts_traces.json')):
+            tx_count += 1
             tx = record.get('tx', {})
             receipt = record.get('receipt', {})
             if not tx.get('hash'): continue
+            # Duplicates are dropped here rather than by a constraint probe in SQLite
+            if tx['hash'] in seen_hashes: continue
+            seen_hashes.add(tx['hash'])
 
-            database.run(
-                """
-                INSERT OR IGNORE INTO transactions (hash, block_number, from_address, to_address, status, tx_data, receipt_data)
-                VALUES (:hash, :block_num, :from, :to, :status, :tx_json, :receipt_json);
-                """,
-                parameters={
-                    "hash": tx.get('hash'),
-                    "block_num": tx.get('blockNumber'),
-                    "from": tx.get('from'),
-                    "to": tx.get('to'),
-                    "status": receipt.get('status'),
-                    "tx_json": json.dumps(tx),
-                    "receipt_json": json.dumps(receipt)
-                }
-            )
-        print(f"-> Loaded {len(tx_data)} transactions.")
+            tx_rows.append((
+                tx.get('hash'),
+                tx.get('blockNumber'),
+                tx.get('from'),
+                tx.get('to'),
+                receipt.get('status'),
+                dumps(tx),
+                dumps(receipt)
+            ))
+            if len(tx_rows) >= TX_INSERT_BATCH:
+                tx_rows.sort(key=itemgetter(0))
+                insert_rows(cursor, tx_insert, tx_rows)
+                tx_rows.clear()
+        tx_rows.sort(key=itemgetter(0))
+        insert_rows(cursor, tx_insert, tx_rows)
+        print(f"-> Loaded {tx_count} transactions.")
     except Exception as e:
-        print(f"Error loading transactions: {e}")
+        # Batches are already inserted by now, so fail the load rather than commit part of the table
+        print(f"FATAL: Could not process txs_receipts_traces.json. Error: {e}")
+        raise
 
     # 3. Load NFTs
     try:
-        with open(os.path.join(DATA_DIR, 'nfts.json'), 'r') as f:
-            nft_data = json.load(f)
+        nft_data = nft_future.result()
 
         # **THE FIX**: Iterate over the 'ownedNfts' list within the JSON object.
         owned_nfts_list = nft_data.get('ownedNfts', [])
-        loaded_count = 0
-        
-        for nft in owned_nfts_list:
-            # Ensure the 'nft' item is a dictionary.
-            if not isinstance(nft, dict):
-                continue
-
-            contract_obj = nft.get('contract')
-            collection_obj = nft.get('collection')
-            
-            contract_address = contract_obj.get('address') if isinstance(contract_obj, dict) else None
-            collection_name = collection_obj.get('name') if isinstance(collection_obj, dict) else None
-            token_id = nft.get('tokenId')
-
-            if not contract_address or not token_id:
-                continue
-            
-            database.run(
-                """
-                INSERT OR IGNORE INTO nfts (wallet_address, contract_address, token_id, name, collection_name, raw_metadata)
-                VALUES (:wallet, :contract, :token_id, :name, :collection, :metadata);
-                """,
-                parameters={
-                    "wallet": wallet_address,
-                    "contract": contract_address,
-                    "token_id": token_id,
-                    "name": nft.get('name'),
-                    "collection": collection_name,
-                    "metadata": json.dumps(nft)
-                }
-            )
-            loaded_count += 1
-        print(f"-> Successfully loaded {loaded_count}/{len(owned_nfts_list)} NFTs.")
+        nft_rows = build_nft_rows(owned_nfts_list, wallet_address)
+        nft_rows.sort(key=itemgetter(1, 2))
+        insert_rows(
+            cursor,
+            "INSERT INTO nfts (wallet_address, contract_address, token_id, name, collection_name, raw_metadata)",
+            nft_rows
+        )
+        print(f"-> Successfully loaded {len(nft_rows)}/{len(owned_nfts_list)} NFTs.")
     except Exception as e:
         print(f"Error loading NFTs: {e}")
 
-
 if __name__ == "__main__":
-    db_file = DB_PATH.replace("sqlite:///", "")
-    if os.path.exists(db_file):
-        print(f"-> Removing existing database file: {db_file}")
-        os.remove(db_file)
+    if os.path.exists(DB_FILE):
+        print(f"-> Removing existing database file: {DB_FILE}")
+        os.remove(DB_FILE)
 
     print("--- Starting Data Pre-processing ---")
-    db = SQLDatabase.from_uri(DB_PATH)
-    setup_database_schema(db)
-    load_data_from_json(db)
+    # Plain sqlite3 in autocommit mode: the loader manages its own transaction, and
+    # blind bulk INSERTs gain nothing from LangChain/SQLAlchemy statement handling
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    try:
+        setup_database_schema(conn)
+        load_data_from_json(conn)
+    finally:
+        conn.close()
     print("--- Data Pre-processing Complete ---")
\ No newline at end of file
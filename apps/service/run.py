@@ -2,20 +2,30 @@
 Simple runner script for the NL to SQL API.
 Run this from the apps/service directory: python run.py
 """
+import sys
 import uvicorn
 from api.config import settings
 
 if __name__ == "__main__":
-    print(f"🚀 Starting {settings.APP_NAME} v{settings.APP_VERSION}")
-    print(f"📊 Database: {settings.DATABASE_URL.split('@')[-1] if '@' in settings.DATABASE_URL else 'Not configured'}")
-    print(f"📚 API Docs: http://{settings.API_HOST}:{settings.API_PORT}/docs")
-    print(f"🔍 Health Check: http://{settings.API_HOST}:{settings.API_PORT}/api/v1/health")
-    print("\nPress CTRL+C to stop the server\n")
+    _, sep, db_host = settings.DATABASE_URL.rpartition('@')
+    base_url = f"http://{settings.API_HOST}:{settings.API_PORT}"
+    # Docs are only served when enabled, so the link is only shown then
+    docs_line = f"📚 API Docs: {base_url}/docs\n" if settings.DOCS_ENABLED else ""
+    sys.stdout.write(
+        f"🚀 Starting {settings.APP_NAME} v{settings.APP_VERSION}\n"
+        f"📊 Database: {db_host if sep else 'Not configured'}\n"
+        f"{docs_line}"
+        f"🔍 Health Check: {base_url}/api/v1/health\n"
+        "\nPress CTRL+C to stop the server\n\n"
+    )
+    sys.stdout.flush()
     
     uvicorn.run(
         "api.main:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
-        reload=settings.API_RELOAD
+        reload=settings.API_RELOAD,
+        # Same event loop as the deploy commands; uvloop isn't available on Windows
+        loop="uvloop" if sys.platform != "win32" else "auto"
     )
 